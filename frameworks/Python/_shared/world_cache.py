@@ -0,0 +1,70 @@
+"""
+Every row of the World table in process memory, for the cached queries test.
+Shared by the Python frameworks that have the test, which add this directory
+to sys.path before importing it.
+
+The random numbers are kept in an array of C ints indexed by id, rather than
+as a dict of objects: the 10,000 rows take 40KB and looking one up is a single
+index. The table is small enough to load whole, so rows are never evicted one
+at a time; instead the whole table is loaded again once it is older than the
+TTL. Only one request reloads it; the others keep serving the old table
+meanwhile, so the reload does not stall the benchmark.
+"""
+from array import array
+import threading
+import time
+
+# Seconds a loaded table is served for before it is loaded again
+TTL = 60
+
+
+class BaseWorldCache(object):
+    """
+    The table and its age. Subclasses decide how a stale table is reloaded.
+    """
+
+    def __init__(self, ttl=TTL):
+        self.ttl = ttl
+        self.numbers = None
+        self.loaded_at = 0
+
+    @property
+    def stale(self):
+        return self.numbers is None or time.time() - self.loaded_at > self.ttl
+
+    def fill(self, rows):
+        """Replaces the cached table with rows of (id, randomNumber)"""
+        rows = list(rows)
+        numbers = array('i', [0]) * (max(row[0] for row in rows) + 1 if rows else 0)
+        for wid, number in rows:
+            numbers[wid] = number
+        self.numbers = numbers
+        self.loaded_at = time.time()
+
+    def worlds(self, ids):
+        numbers = self.numbers
+        return [{'id': wid, 'randomNumber': numbers[wid]} for wid in ids]
+
+
+class WorldCache(BaseWorldCache):
+    """
+    A cache shared by the threads of a WSGI worker.
+    """
+
+    def __init__(self, ttl=TTL):
+        BaseWorldCache.__init__(self, ttl)
+        self.lock = threading.Lock()
+
+    def refresh(self, load):
+        """Fills the cache with load() if it is stale and no other request is already doing so"""
+        if not self.stale:
+            return
+        if self.lock.acquire(False):
+            try:
+                if self.stale:
+                    self.fill(load())
+            finally:
+                self.lock.release()
+        elif self.numbers is None:
+            # There is no old table to serve until the first load is done
+            self.fill(load())
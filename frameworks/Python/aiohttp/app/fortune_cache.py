@@ -0,0 +1,47 @@
+from bisect import bisect
+from operator import itemgetter
+
+
+class FortuneCache:
+    """
+    The fortunes, sorted by message, kept in memory until the table changes.
+
+    create-postgres.sql makes the database NOTIFY fortune_changed whenever the
+    Fortune table is written to, and invalidate is the listener for it. Every
+    invalidation bumps version, so that rows fetched while the table was
+    changing are used once but not kept.
+    """
+
+    def __init__(self):
+        self.rows = None
+        self.messages = None
+        self.version = 0
+
+    def invalidate(self, *args):
+        self.rows = None
+        self.messages = None
+        self.version += 1
+
+    async def get(self, pool):
+        """
+        :return: the sorted fortunes and their messages, from the database if not cached.
+        """
+        if self.rows is not None:
+            return self.rows, self.messages
+        version = self.version
+        async with pool.acquire() as conn:
+            rows = await conn.fetch('SELECT * FROM Fortune')
+        rows.sort(key=itemgetter('message'))
+        messages = [row['message'] for row in rows]
+        if version == self.version:
+            self.rows, self.messages = rows, messages
+        return rows, messages
+
+    async def with_fortune(self, pool, fortune):
+        """
+        :return: the sorted fortunes with another one inserted in its place,
+        after any with the same message as sorting them all would put it.
+        """
+        rows, messages = await self.get(pool)
+        index = bisect(messages, fortune['message'])
+        return rows[:index] + [fortune] + rows[index:]
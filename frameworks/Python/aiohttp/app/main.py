@@ -9,21 +9,35 @@ import jinja2
 from aiohttp import web
 from sqlalchemy.engine.url import URL
 
+from .fortune_cache import FortuneCache
+from .world_cache import AsyncWorldCache
 from .views import (
     json,
     single_database_query_orm,
     multiple_database_queries_orm,
+    cached_worlds_orm,
     fortunes,
     updates,
+    updates_bulk,
     plaintext,
+    stream,
+    post,
 
     single_database_query_raw,
     multiple_database_queries_raw,
+    multiple_database_queries_raw_batch,
+    cached_worlds_raw,
     fortunes_raw,
+    fortunes_raw_cached,
     updates_raw,
 )
 
-CONNECTION_ORM = os.getenv('CONNECTION', 'ORM').upper() == 'ORM'
+# ORM, RAW or RAW_BATCH, which is RAW with the queries of a request fetched at once,
+# or ORM_BULK, which is ORM with the updates of a request made in one statement
+CONNECTION = os.getenv('CONNECTION', 'ORM').upper()
+CONNECTION_ORM = CONNECTION in ('ORM', 'ORM_BULK')
+# Keep the fortunes in memory until the database notifies that they changed, RAW modes only
+CACHED_FORTUNES = os.getenv('CACHED_FORTUNES', '').lower() in ('1', 'true', 'yes')
 
 THIS_DIR = Path(__file__).parent
 
@@ -50,11 +64,15 @@ async def startup(app: web.Application):
     max_size = min(1800 / multiprocessing.cpu_count(), 160)
     max_size = max(int(max_size), 1)
     min_size = max(int(max_size / 2), 1)
-    print(f'connection pool: min size: {min_size}, max size: {max_size}, orm: {CONNECTION_ORM}')
+    print(f'connection pool: min size: {min_size}, max size: {max_size}, connection: {CONNECTION}')
     if CONNECTION_ORM:
         app['pg'] = await aiopg.sa.create_engine(dsn=dsn, minsize=min_size, maxsize=max_size, loop=app.loop)
     else:
         app['pg'] = await asyncpg.create_pool(dsn=dsn, min_size=min_size, max_size=max_size, loop=app.loop)
+        if CACHED_FORTUNES:
+            app['fortunes'] = FortuneCache()
+            app['fortunes_listener'] = await asyncpg.connect(dsn=dsn, loop=app.loop)
+            await app['fortunes_listener'].add_listener('fortune_changed', app['fortunes'].invalidate)
 
 
 async def cleanup(app: web.Application):
@@ -62,6 +80,8 @@ async def cleanup(app: web.Application):
         app['pg'].close()
         await app['pg'].wait_closed()
     else:
+        if CACHED_FORTUNES:
+            await app['fortunes_listener'].close()
         await app['pg'].close()
 
 
@@ -70,13 +90,23 @@ def setup_routes(app):
         app.router.add_get('/json', json)
         app.router.add_get('/db', single_database_query_orm)
         app.router.add_get('/queries/{queries:.*}', multiple_database_queries_orm)
+        app.router.add_get('/cached-worlds', cached_worlds_orm)
         app.router.add_get('/fortunes', fortunes)
-        app.router.add_get('/updates/{queries:.*}', updates)
+        app.router.add_get('/updates/{queries:.*}', updates_bulk if CONNECTION == 'ORM_BULK' else updates)
         app.router.add_get('/plaintext', plaintext)
+        app.router.add_get('/stream/{size:.*}', stream)
+        app.router.add_post('/post', post)
+    elif CONNECTION == 'RAW_BATCH':
+        app.router.add_get('/db', single_database_query_raw)
+        app.router.add_get('/queries/{queries:.*}', multiple_database_queries_raw_batch)
+        app.router.add_get('/cached-worlds', cached_worlds_raw)
+        app.router.add_get('/fortunes', fortunes_raw_cached if CACHED_FORTUNES else fortunes_raw)
+        app.router.add_get('/updates/{queries:.*}', updates_raw)
     else:
         app.router.add_get('/db', single_database_query_raw)
         app.router.add_get('/queries/{queries:.*}', multiple_database_queries_raw)
-        app.router.add_get('/fortunes', fortunes_raw)
+        app.router.add_get('/cached-worlds', cached_worlds_raw)
+        app.router.add_get('/fortunes', fortunes_raw_cached if CACHED_FORTUNES else fortunes_raw)
         app.router.add_get('/updates/{queries:.*}', updates_raw)
 
 
@@ -86,6 +116,8 @@ def create_app(loop):
     jinja2_loader = jinja2.FileSystemLoader(str(THIS_DIR / 'templates'))
     aiohttp_jinja2.setup(app, loader=jinja2_loader)
 
+    app['worlds'] = AsyncWorldCache()
+
     app.on_startup.append(startup)
     app.on_cleanup.append(cleanup)
 
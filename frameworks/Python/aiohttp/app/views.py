@@ -1,11 +1,13 @@
+import hashlib
 from operator import attrgetter, itemgetter
 from random import randint
 
 from aiohttp_jinja2 import template
-from aiohttp.web import Response
+from aiohttp.web import Response, StreamResponse
 import ujson
 
-from sqlalchemy import select
+from sqlalchemy import Integer, any_, func, literal, select
+from sqlalchemy.dialects.postgresql import ARRAY
 
 from .models import sa_fortunes, sa_worlds, Fortune
 
@@ -27,6 +29,18 @@ def get_num_queries(request):
     return num_queries
 
 
+def get_count(request):
+    try:
+        count = int(request.rel_url.query.get('count', 1))
+    except ValueError:
+        return 1
+    if count < 1:
+        return 1
+    if count > 500:
+        return 500
+    return count
+
+
 async def json(request):
     """
     Test 1
@@ -94,6 +108,57 @@ async def multiple_database_queries_raw(request):
     return json_response(result)
 
 
+async def multiple_database_queries_raw_batch(request):
+    """
+    Test 3 RAW, all of the rows fetched with one query
+    """
+    num_queries = get_num_queries(request)
+
+    ids = [randint(1, 10000) for _ in range(num_queries)]
+    ids.sort()
+
+    async with request.app['pg'].acquire() as conn:
+        rows = await conn.fetch(
+            'SELECT w.id, w.randomnumber FROM world w JOIN unnest($1::int[]) AS r(id) ON w.id = r.id', ids
+        )
+    numbers = {row['id']: row['randomnumber'] for row in rows}
+    result = [{'id': id_, 'randomNumber': numbers[id_]} for id_ in ids]
+    return json_response(result)
+
+
+async def load_worlds_orm(pg):
+    async with pg.acquire() as conn:
+        cur = await conn.execute(select([sa_worlds.c.id, sa_worlds.c.randomnumber]))
+        return await cur.fetchall()
+
+
+async def load_worlds_raw(pg):
+    async with pg.acquire() as conn:
+        return await conn.fetch('SELECT id, randomnumber FROM world')
+
+
+async def cached_worlds_orm(request):
+    """
+    Cached queries ORM
+    """
+    count = get_count(request)
+
+    cache = request.app['worlds']
+    await cache.refresh(lambda: load_worlds_orm(request.app['pg']))
+    return json_response(cache.worlds([randint(1, 10000) for _ in range(count)]))
+
+
+async def cached_worlds_raw(request):
+    """
+    Cached queries RAW
+    """
+    count = get_count(request)
+
+    cache = request.app['worlds']
+    await cache.refresh(lambda: load_worlds_raw(request.app['pg']))
+    return json_response(cache.worlds([randint(1, 10000) for _ in range(count)]))
+
+
 @template('fortune.jinja')
 async def fortunes(request):
     """
@@ -119,6 +184,16 @@ async def fortunes_raw(request):
     return {'fortunes': fortunes}
 
 
+@template('fortune.jinja')
+async def fortunes_raw_cached(request):
+    """
+    Test 4 RAW, with the sorted fortunes kept in memory until the table changes
+    """
+    fortune = dict(id=0, message='Additional fortune added at request time.')
+    fortunes = await request.app['fortunes'].with_fortune(request.app['pg'], fortune)
+    return {'fortunes': fortunes}
+
+
 async def updates(request):
     """
     Test 5 ORM
@@ -146,6 +221,38 @@ async def updates(request):
             result.append({'id': id_, 'randomNumber': rand_new})
     return json_response(result)
 
+
+async def updates_bulk(request):
+    """
+    Test 5 ORM, with one SELECT and one UPDATE for all of the rows
+    """
+    num_queries = get_num_queries(request)
+
+    ids = [randint(1, 10000) for _ in range(num_queries)]
+    ids.sort()
+
+    async with request.app['pg'].acquire() as conn:
+        cur = await conn.execute(
+            select([sa_worlds.c.id, sa_worlds.c.randomnumber])
+            .where(sa_worlds.c.id == any_(literal(ids, ARRAY(Integer))))
+        )
+        # the previous random numbers, which we don't actually use
+        await cur.fetchall()
+
+        # a repeated id gets one new number, the one the database keeps
+        numbers = {id_: randint(1, 10000) for id_ in ids}
+        new = select([
+            func.unnest(literal(list(numbers.keys()), ARRAY(Integer))).label('id'),
+            func.unnest(literal(list(numbers.values()), ARRAY(Integer))).label('randomnumber'),
+        ]).alias('new')
+        await conn.execute(
+            sa_worlds.update()
+            .values(randomnumber=new.c.randomnumber)
+            .where(sa_worlds.c.id == new.c.id)
+        )
+    return json_response([{'id': id_, 'randomNumber': numbers[id_]} for id_ in ids])
+
+
 async def updates_raw(request):
     """
     Test 5 RAW
@@ -175,3 +282,40 @@ async def plaintext(request):
     Test 6
     """
     return Response(body=b'Hello, World!', content_type='text/plain')
+
+
+async def post(request):
+    """
+    JSON ingestion
+    """
+    body = await request.read()
+    data = await request.json(loads=ujson.loads)
+    return json_response({'count': len(data['items']), 'digest': hashlib.sha256(body).hexdigest()})
+
+
+STREAM_CHUNK = b'0123456789abcdef' * 4096
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+
+async def stream(request):
+    """
+    Large responses, streamed in 64KB chunks
+    """
+    try:
+        size = int(request.match_info.get('size', 65536))
+    except ValueError:
+        size = 65536
+    size = min(max(size, 0), MAX_STREAM_SIZE)
+
+    response = StreamResponse()
+    response.content_type = 'text/plain'
+    response.content_length = size
+    await response.prepare(request)
+    full, rest = divmod(size, len(STREAM_CHUNK))
+    for _ in range(full):
+        response.write(STREAM_CHUNK)
+        await response.drain()
+    if rest:
+        response.write(STREAM_CHUNK[:rest])
+        await response.drain()
+    return response
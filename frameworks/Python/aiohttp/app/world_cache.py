@@ -0,0 +1,33 @@
+import asyncio
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / '_shared'))
+
+from world_cache import BaseWorldCache, TTL
+
+
+class AsyncWorldCache(BaseWorldCache):
+    """
+    The World table cached as in _shared/world_cache.py, loaded by a
+    coroutine. Requests that find it stale start one load between them and
+    keep serving the old table, or wait for the load if there is none yet.
+    """
+
+    def __init__(self, ttl=TTL):
+        BaseWorldCache.__init__(self, ttl)
+        self.loading = None
+
+    async def refresh(self, load):
+        if not self.stale:
+            return
+        if self.loading is None:
+            self.loading = asyncio.ensure_future(self._load(load))
+        if self.numbers is None:
+            await asyncio.shield(self.loading)
+
+    async def _load(self, load):
+        try:
+            self.fill(await load())
+        finally:
+            self.loading = None
@@ -0,0 +1,5 @@
+#!/bin/bash
+
+export CONNECTION=ORM_BULK
+
+source $TROOT/setup.sh
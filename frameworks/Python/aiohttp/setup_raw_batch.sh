@@ -0,0 +1,5 @@
+#!/bin/bash
+
+export CONNECTION=RAW_BATCH
+
+source $TROOT/setup.sh
@@ -0,0 +1,6 @@
+#!/bin/bash
+
+export CONNECTION=RAW
+export CACHED_FORTUNES=1
+
+source $TROOT/setup.sh
@@ -18,6 +18,9 @@ urlpatterns = patterns('',
     url(r'^json$', 'world.views.json'),
     url(r'^db$', 'world.views.db'),
     url(r'^dbs$', 'world.views.dbs'),
+    url(r'^cached-worlds$', 'world.views.cached_worlds'),
     url(r'^fortunes$', 'world.views.fortunes'),
     url(r'^update$', 'world.views.update'),
+    url(r'^post$', 'world.views.post'),
+    url(r'^stream$', 'world.views.stream'),
 )
@@ -1,22 +1,34 @@
 # Create your views here.
 
 from django.template import Context, loader
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
 from django.core import serializers
 from world.models import World, Fortune
 from django.shortcuts import render
-from ujson import dumps as uj_dumps
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from ujson import dumps as uj_dumps, loads as uj_loads
+import hashlib
+import os
 import random
 import sys
 from operator import attrgetter
 from functools import partial
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, os.pardir, '_shared'))
+from world_cache import WorldCache
+
 if sys.version_info[0] == 3:
   xrange = range
 
-def _get_queries(request):
+world_cache = WorldCache()
+
+STREAM_CHUNK = b'0123456789abcdef' * 4096
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+def _get_queries(request, name='queries'):
   try:
-    queries = int(request.GET.get('queries', 1))
+    queries = int(request.GET.get(name, 1))
   except Exception:
     queries = 1
   if queries < 1:
@@ -34,6 +46,30 @@ def json(request):
   }
   return HttpResponse(uj_dumps(response), content_type="application/json")
 
+@csrf_exempt
+@require_POST
+def post(request):
+  body = request.body
+  items = uj_loads(body)['items']
+  return HttpResponse(uj_dumps({'count': len(items), 'digest': hashlib.sha256(body).hexdigest()}), content_type="application/json")
+
+def _stream_chunks(size):
+  full, rest = divmod(size, len(STREAM_CHUNK))
+  for _ in xrange(full):
+    yield STREAM_CHUNK
+  if rest:
+    yield STREAM_CHUNK[:rest]
+
+def stream(request):
+  try:
+    size = int(request.GET.get('size', 65536))
+  except Exception:
+    size = 65536
+  size = min(max(size, 0), MAX_STREAM_SIZE)
+  response = StreamingHttpResponse(_stream_chunks(size), content_type="text/plain")
+  response['Content-Length'] = str(size)
+  return response
+
 def db(request):
   r = random.randint(1, 10000)
   world = uj_dumps({'id' : r, 'randomNumber' : World.objects.get(id=r).randomnumber})
@@ -60,6 +96,13 @@ def dbs(request):
   worlds = uj_dumps([{'id' : r, 'randomNumber' : g(id=r).randomnumber} for r in [rp() for q in xrange(queries)]])
   return HttpResponse(worlds, content_type="application/json")
 
+def cached_worlds(request):
+  count = _get_queries(request, 'count')
+  world_cache.refresh(lambda: World.objects.values_list('id', 'randomnumber'))
+  rp = partial(random.randint, 1, 10000)
+  worlds = uj_dumps(world_cache.worlds([rp() for q in xrange(count)]))
+  return HttpResponse(worlds, content_type="application/json")
+
 def fortunes(request):
   fortunes = list(Fortune.objects.all())
   fortunes.append(Fortune(id=0, message="Additional fortune added at request time."))
@@ -1,7 +1,32 @@
 #!/usr/bin/env python
+import hashlib
 import json
+import os
+from random import randint
+import sys
 
 import falcon
+import pymysql
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '_shared'))
+from world_cache import WorldCache
+
+DBHOST = os.environ.get('DBHOST', 'localhost')
+
+world_cache = WorldCache()
+
+STREAM_CHUNK = b'0123456789abcdef' * 4096
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+
+def load_worlds():
+    connection = pymysql.connect(host=DBHOST, user='benchmarkdbuser', passwd='benchmarkdbpass', db='hello_world')
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT id, randomNumber FROM world")
+        return cursor.fetchall()
+    finally:
+        connection.close()
 
 
 # resource endpoints
@@ -17,11 +42,53 @@ class PlaintextResource(object):
         response.set_header('Content-Type', 'text/plain')
         response.body = b'Hello, world!'
 
+
+class PostResource(object):
+    def on_post(self, request, response):
+        body = request.stream.read(request.content_length or 0)
+        items = json.loads(body.decode('utf-8'))['items']
+        response.body = json.dumps({'count': len(items), 'digest': hashlib.sha256(body).hexdigest()})
+
+
+class CachedWorldsResource(object):
+    def on_get(self, request, response):
+        try:
+            count = int(request.get_param('count') or 1)
+        except ValueError:
+            count = 1
+        count = min(max(count, 1), 500)
+        world_cache.refresh(load_worlds)
+        response.body = json.dumps(world_cache.worlds([randint(1, 10000) for _ in range(count)]))
+
+
+def stream_chunks(size):
+    full, rest = divmod(size, len(STREAM_CHUNK))
+    for _ in range(full):
+        yield STREAM_CHUNK
+    if rest:
+        yield STREAM_CHUNK[:rest]
+
+
+class StreamResource(object):
+    """Large responses, written as a WSGI iterable of 64KB chunks"""
+    def on_get(self, request, response):
+        try:
+            size = int(request.get_param('size') or 65536)
+        except ValueError:
+            size = 65536
+        size = min(max(size, 0), MAX_STREAM_SIZE)
+        response.set_header('Content-Type', 'text/plain')
+        response.stream = stream_chunks(size)
+        response.stream_len = size
+
 # setup
 
 app = falcon.API()
 app.add_route("/json", JSONResource())
 app.add_route("/plaintext", PlaintextResource())
+app.add_route("/post", PostResource())
+app.add_route("/cached-worlds", CachedWorldsResource())
+app.add_route("/stream", StreamResource())
 
 # entry point for debugging
 if __name__ == "__main__":
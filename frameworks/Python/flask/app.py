@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 from functools import partial
+import hashlib
 import json
 from operator import attrgetter
 import os
@@ -7,11 +8,14 @@ from random import randint
 import sys
 
 import flask
-from flask import Flask, request, render_template, make_response, jsonify
+from flask import Flask, Response, request, render_template, make_response, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine
+from sqlalchemy import case, create_engine
 from sqlalchemy.ext import baked
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, '_shared'))
+from world_cache import WorldCache
+
 if sys.version_info[0] == 3:
     xrange = range
 
@@ -31,6 +35,7 @@ db = SQLAlchemy(app)
 dbraw_engine = create_engine(app.config['SQLALCHEMY_DATABASE_URI'], connect_args={'autocommit': True}, pool_reset_on_return=None)
 
 bakery = baked.bakery()
+world_cache = WorldCache()
 
 
 # models
@@ -88,6 +93,25 @@ def get_random_world():
     return json_response(worlds)
 
 
+def get_worlds_batch(ids):
+    """Fetches the worlds with the given ids in one query, in the order of ids"""
+    worlds = World.query.filter(World.id.in_(list(set(ids))))
+    by_id = dict((world.id, world) for world in worlds)
+    return [by_id[wid] for wid in ids]
+
+
+@app.route("/db-batch")
+def get_random_world_batch():
+    num_queries = request.args.get("queries", 1, type=int)
+    if num_queries < 1:
+        num_queries = 1
+    if num_queries > 500:
+        num_queries = 500
+    ids = [randint(1, 10000) for _ in xrange(num_queries)]
+    worlds = [world.serialize for world in get_worlds_batch(ids)]
+    return json_response(worlds)
+
+
 @app.route("/dbs")
 def get_random_world_single():
     wid = randint(1, 10000)
@@ -121,6 +145,17 @@ def get_random_world_single_raw():
     connection.close()
     return json_response(worlds)
 
+@app.route("/cached-worlds")
+def get_cached_worlds():
+    count = request.args.get("count", 1, type=int)
+    if count < 1:
+        count = 1
+    if count > 500:
+        count = 500
+    world_cache.refresh(lambda: db.session.query(World.id, World.randomNumber))
+    worlds = world_cache.worlds([randint(1, 10000) for _ in xrange(count)])
+    return json_response(worlds)
+
 @app.route("/fortunes")
 def get_fortunes():
     fortunes = list(Fortune.query.all())
@@ -160,6 +195,26 @@ def updates():
     return res
 
 
+@app.route("/updates-batch")
+def updates_batch():
+    """Test 5: Database Updates, one SELECT and one UPDATE per request"""
+    num_queries = request.args.get('queries', 1, type=int)
+    if num_queries < 1:
+        num_queries = 1
+    if num_queries > 500:
+        num_queries = 500
+
+    rp = partial(randint, 1, 10000)
+    ids = [rp() for _ in xrange(num_queries)]
+    worlds = get_worlds_batch(ids)
+    # A repeated id gets one new number, the one the database keeps
+    numbers = dict((world.id, rp()) for world in worlds)
+    World.query.filter(World.id.in_(list(numbers))).update(
+        {World.randomNumber: case(numbers, value=World.id)}, synchronize_session=False)
+    db.session.commit()
+    return json_response([{'id': wid, 'randomNumber': numbers[wid]} for wid in ids])
+
+
 @app.route("/raw-updates")
 def raw_updates():
     """Test 5: Database Updates"""
@@ -191,6 +246,39 @@ def plaintext():
     return response
 
 
+@app.route('/post', methods=['POST'])
+def post():
+    """JSON ingestion: parse the body, answer with its item count and digest"""
+    items = request.get_json(force=True)['items']
+    body = request.get_data()
+    return json_response({'count': len(items), 'digest': hashlib.sha256(body).hexdigest()})
+
+
+STREAM_CHUNK = b'0123456789abcdef' * 4096
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+
+def stream_chunks(size):
+    full, rest = divmod(size, len(STREAM_CHUNK))
+    for _ in xrange(full):
+        yield STREAM_CHUNK
+    if rest:
+        yield STREAM_CHUNK[:rest]
+
+
+@app.route('/stream')
+def stream():
+    """Large responses, written as a WSGI iterable of 64KB chunks"""
+    size = request.args.get('size', 65536, type=int)
+    if size < 0:
+        size = 0
+    if size > MAX_STREAM_SIZE:
+        size = MAX_STREAM_SIZE
+    response = Response(stream_chunks(size), content_type='text/plain')
+    response.headers['Content-Length'] = str(size)
+    return response
+
+
 try:
     import meinheld
     meinheld.server.set_access_logger(None)
@@ -1,23 +1,50 @@
 import asyncio
 import asyncpg
+from bisect import bisect
 import jinja2
 import os
 import ujson as json
 from operator import itemgetter
+from urllib.parse import parse_qs
+
+
+# Keep the sorted fortunes in memory until the database notifies that they changed
+CACHED_FORTUNES = os.getenv('CACHED_FORTUNES', '').lower() in ('1', 'true', 'yes')
+
+DATABASE = dict(
+    user=os.getenv('PGUSER', 'benchmarkdbuser'),
+    password=os.getenv('PGPASS', 'benchmarkdbpass'),
+    database='hello_world',
+    host=os.getenv('DBHOST', 'localhost'),
+    port=5432
+)
 
 
 async def setup():
-    global pool
-    pool = await asyncpg.create_pool(
-        user=os.getenv('PGUSER', 'benchmarkdbuser'),
-        password=os.getenv('PGPASS', 'benchmarkdbpass'),
-        database='hello_world',
-        host=os.getenv('DBHOST', 'localhost'),
-        port=5432
-    )
+    global pool, listener
+    pool = await asyncpg.create_pool(**DATABASE)
+    if CACHED_FORTUNES:
+        # create-postgres.sql makes the database NOTIFY fortune_changed
+        # whenever the Fortune table is written to
+        listener = await asyncpg.connect(**DATABASE)
+        await listener.add_listener('fortune_changed', invalidate_fortunes)
+
+
+def invalidate_fortunes(*args):
+    global cached_fortunes, cached_messages, fortunes_version
+    cached_fortunes = None
+    cached_messages = None
+    fortunes_version += 1
 
 
 pool = None
+listener = None
+# The sorted fortunes and their messages, while cached. Every invalidation
+# bumps the version, so that rows fetched while the table was changing are
+# used once but not kept
+cached_fortunes = None
+cached_messages = None
+fortunes_version = 0
 additional = [0, 'Additional fortune added at request time.']
 key = itemgetter(1)
 template = None
@@ -59,6 +86,33 @@ async def fortunes_endpoint(message, channels):
         await pool.release(connection)
 
 
+async def cached_fortunes_endpoint(message, channels):
+    global cached_fortunes, cached_messages
+    fortunes, messages = cached_fortunes, cached_messages
+    if fortunes is None:
+        version = fortunes_version
+        connection = await pool.acquire()
+        try:
+            fortunes = await connection.fetch('SELECT * FROM Fortune')
+        finally:
+            await pool.release(connection)
+        fortunes.sort(key=key)
+        messages = [fortune[1] for fortune in fortunes]
+        if version == fortunes_version:
+            cached_fortunes, cached_messages = fortunes, messages
+
+    # Where sorting them all would put the request-time fortune
+    index = bisect(messages, additional[1])
+    content = template.render(fortunes=fortunes[:index] + [additional] + fortunes[index:]).encode('utf-8')
+    await channels['reply'].send({
+        'status': 200,
+        'headers': [
+            [b'content-type', b'text/html; charset=utf-8'],
+        ],
+        'content': content
+    })
+
+
 async def plaintext_endpoint(message, channels):
     await channels['reply'].send({
         'status': 200,
@@ -69,6 +123,39 @@ async def plaintext_endpoint(message, channels):
     })
 
 
+STREAM_CHUNK = b'0123456789abcdef' * 4096
+MAX_STREAM_SIZE = 64 * 1024 * 1024
+
+
+async def stream_endpoint(message, channels):
+    query = parse_qs(message.get('query_string', b'').decode('latin-1'))
+    try:
+        size = min(max(int(query['size'][0]), 0), MAX_STREAM_SIZE)
+    except (KeyError, ValueError):
+        size = 65536
+    full, rest = divmod(size, len(STREAM_CHUNK))
+    chunks = [STREAM_CHUNK] * full
+    if rest:
+        chunks.append(STREAM_CHUNK[:rest])
+
+    # The first message starts the response, the rest follow it with
+    # more_content set on all but the last
+    await channels['reply'].send({
+        'status': 200,
+        'headers': [
+            [b'content-type', b'text/plain'],
+            [b'content-length', str(size).encode()],
+        ],
+        'content': chunks[0] if chunks else b'',
+        'more_content': len(chunks) > 1
+    })
+    for index in range(1, len(chunks)):
+        await channels['reply'].send({
+            'content': chunks[index],
+            'more_content': index < len(chunks) - 1
+        })
+
+
 async def handle_404(message, channels):
     await channels['reply'].send({
         'status': 404,
@@ -81,8 +168,9 @@ async def handle_404(message, channels):
 
 routes = {
     '/json': json_endpoint,
-    '/fortunes': fortunes_endpoint,
-    '/plaintext': plaintext_endpoint
+    '/fortunes': cached_fortunes_endpoint if CACHED_FORTUNES else fortunes_endpoint,
+    '/plaintext': plaintext_endpoint,
+    '/stream': stream_endpoint
 }
 
 
@@ -0,0 +1,5 @@
+#!/bin/bash
+
+export CACHED_FORTUNES=1
+
+source $TROOT/setup.sh
@@ -0,0 +1,118 @@
+'''
+Aggregates the repetitions of a benchmark level (see --repetitions).
+
+With more than one repetition the parsed output holds one entry per
+run of a level. group_repetitions folds consecutive runs of the same
+level into a single entry: the run with the median throughput, so the
+fields existing consumers read stay meaningful, with every run under
+'repetitions' and robust statistics under 'aggregate':
+
+  median - the median across repetitions
+  mad    - the median absolute deviation from that median
+  ci     - [low, high] bootstrap confidence interval of the median
+  n      - the number of repetitions that reported the metric
+'''
+import random
+
+# Resamples drawn for each bootstrap confidence interval
+RESAMPLES = 2000
+CONFIDENCE = 0.95
+# Fixed so that re-parsing a run gives the same intervals
+SEED = 0
+
+
+def median(values):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    middle = len(ordered) // 2
+    if len(ordered) % 2:
+        return ordered[middle]
+    return (ordered[middle - 1] + ordered[middle]) / 2.0
+
+
+def mad(values):
+    '''
+    Median absolute deviation from the median
+    '''
+    center = median(values)
+    if center is None:
+        return None
+    return median([abs(value - center) for value in values])
+
+
+def bootstrap_ci(values, statistic=median, resamples=RESAMPLES, confidence=CONFIDENCE, seed=SEED):
+    '''
+    Percentile bootstrap confidence interval of statistic(values).
+    Returns [low, high]
+    '''
+    if not values:
+        return None
+    rng = random.Random(seed)
+    n = len(values)
+    estimates = sorted(statistic([values[rng.randrange(n)] for _ in range(n)])
+                       for _ in range(resamples))
+    tail = (1.0 - confidence) / 2.0
+    low = estimates[int(tail * (resamples - 1))]
+    high = estimates[int((1.0 - tail) * (resamples - 1))]
+    return [low, high]
+
+
+def describe(values):
+    values = [value for value in values if value is not None]
+    if not values:
+        return None
+    return {
+        'median': median(values),
+        'mad': mad(values),
+        'ci': bootstrap_ci(values),
+        'n': len(values)
+    }
+
+
+def _p99(run):
+    return run.get('latency', {}).get('percentiles', {}).get('99')
+
+
+def _latency_mean(run):
+    return run.get('latency', {}).get('mean')
+
+
+# The metrics aggregated for every level
+METRICS = [
+    ('requestsPerSecond', lambda run: run.get('requestsPerSecond')),
+    ('bytesPerSecond', lambda run: run.get('bytesPerSecond')),
+    ('errorRate', lambda run: run.get('errorRate')),
+    ('latencyMean', _latency_mean),
+    ('latencyP99', _p99)
+]
+
+
+def aggregate(runs):
+    '''
+    Folds the runs of one level into a single entry
+    '''
+    throughput = [run.get('requestsPerSecond', 0) for run in runs]
+    # The lower median, so the entry is one of the actual runs
+    middle = sorted(range(len(runs)), key=lambda i: throughput[i])[(len(runs) - 1) // 2]
+    entry = dict(runs[middle])
+    entry['repetitions'] = runs
+    entry['aggregate'] = dict((name, describe([get(run) for run in runs])) for name, get in METRICS)
+    return entry
+
+
+def group_repetitions(runs):
+    '''
+    Groups consecutive runs of the same level. Levels that ran once
+    are returned unchanged
+    '''
+    grouped = []
+    group = []
+    for run in runs:
+        if group and (run.get('level') is None or run.get('level') != group[0].get('level')):
+            grouped.append(group)
+            group = []
+        group.append(run)
+    if group:
+        grouped.append(group)
+    return [group[0] if len(group) == 1 else aggregate(group) for group in grouped]
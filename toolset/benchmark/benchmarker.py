@@ -1,6 +1,9 @@
 from setup.linux import setup_util
 
+from benchmark import aggregation
 from benchmark import framework_test
+from benchmark import regressions
+from benchmark import startup
 from benchmark.test_types import *
 from utils import header
 from utils import gather_tests
@@ -104,6 +107,40 @@ class Benchmarker:
     # End parse_timestamp
     ############################################################
 
+    ############################################################
+    # compare_timestamps
+    # Compares the results of two timestamps, prints the levels
+    # that got slower or faster beyond the noise and saves the
+    # report next to the second timestamp's results.json.
+    # Returns 1 if there were regressions.
+    ############################################################
+    def compare_timestamps(self):
+        (before, after) = self.compare
+        results = []
+        for timestamp in self.compare:
+            try:
+                with open(os.path.join(self.result_directory, timestamp, 'results.json')) as f:
+                    results.append(json.load(f))
+            except (IOError, ValueError) as e:
+                print "Unable to read results.json for %s: %s" % (timestamp, e)
+                return 1
+
+        report = regressions.compare(results[0], results[1])
+        report['before'] = before
+        report['after'] = after
+        print header("Comparing %s to %s" % (before, after))
+        print regressions.format_report(report)
+
+        report_file = os.path.join(self.result_directory, after, "regressions-%s.json" % before)
+        with open(report_file, 'w') as f:
+            json.dump(report, f, indent=2)
+        print "Report saved in " + report_file
+        return 1 if report['regressions'] else 0
+
+    ############################################################
+    # End compare_timestamps
+    ############################################################
+
     ############################################################
     # Run the tests:
     # This process involves setting up the client/server machines
@@ -282,6 +319,125 @@ class Benchmarker:
             self.results['verify'][framework.name] = dict()
         self.results['verify'][framework.name][test] = result
 
+    ############################################################
+    # report_ready_results
+    # Used by __run_test to record how long a framework took to
+    # answer its URLs after binding its port
+    ############################################################
+    def report_ready_results(self, framework, seconds):
+        if 'timeToReady' not in self.results:
+            self.results['timeToReady'] = dict()
+        self.results['timeToReady'][framework.name] = round(seconds, 3)
+
+    ############################################################
+    # report_memory_results
+    # Used by __run_test to record the memory of a framework's
+    # processes (see FrameworkTest.measure_memory) once it is
+    # ready and after it has been benchmarked. The change between
+    # the two is recorded as growth, to catch leaks
+    ############################################################
+    def report_memory_results(self, framework, stage, memory):
+        if 'memory' not in self.results:
+            self.results['memory'] = dict()
+        if framework.name not in self.results['memory']:
+            self.results['memory'][framework.name] = dict()
+        results = self.results['memory'][framework.name]
+        results[stage] = memory
+
+        if 'ready' in results and 'after' in results:
+            before = results['ready']
+            after = results['after']
+            results['growth'] = {
+                'rss': after['rss'] - before['rss'],
+                'uss': after['uss'] - before['uss'],
+                'ussRatio': after['uss'] / float(before['uss']) if before['uss'] > 0 else None
+            }
+
+    ############################################################
+    # report_level_memory_results
+    # Used by FrameworkTest to record the peak memory of the
+    # framework's processes during each level of a test type
+    ############################################################
+    def report_level_memory_results(self, framework, test, results):
+        # Without --repetitions the entries do not carry their level,
+        # so it is looked up by position as regressions does
+        names = regressions.level_names(self.results, test) or []
+        levels = []
+        for index, level in enumerate(results or []):
+            processes = level.get('processStats')
+            if not processes:
+                continue
+            levels.append({
+                'level': level.get('level', names[index] if index < len(names) else index),
+                'rss': processes['memory']['max'],
+                'uss': (processes.get('privateMemory') or {}).get('max')
+            })
+        if not levels:
+            return
+        if 'memory' not in self.results:
+            self.results['memory'] = dict()
+        if framework.name not in self.results['memory']:
+            self.results['memory'][framework.name] = dict()
+        self.results['memory'][framework.name].setdefault('levels', dict())[test] = levels
+
+    ############################################################
+    # report_startup_results
+    # Used by __benchmark_startup to record how long each restart
+    # of a framework took to bind its port and to answer each of
+    # its URLs, and how long its module took to import
+    ############################################################
+    def report_startup_results(self, framework, runs, imports):
+        results = {
+            'runs': len(runs),
+            'portBound': aggregation.describe([run['portBound'] for run in runs]),
+            'firstResponse': dict(),
+            'raw': runs
+        }
+        for test_type in framework.runTests:
+            results['firstResponse'][test_type] = aggregation.describe(
+                [run['firstResponse'].get(test_type) for run in runs])
+        if imports is not None:
+            results['importTime'] = {
+                'module': imports['module'],
+                'seconds': aggregation.describe(imports['seconds']),
+                'slowest': imports['slowest']
+            }
+        if 'startup' not in self.results:
+            self.results['startup'] = dict()
+        self.results['startup'][framework.name] = results
+
+    ############################################################
+    # report_warmup_results
+    # Used by FrameworkTest to record how long the warmup before
+    # a test type's benchmark ran, and whether it ended because
+    # the throughput was steady or because it ran out of time
+    ############################################################
+    def report_warmup_results(self, framework, test, warmup):
+        if warmup is None:
+            return
+        if 'warmup' not in self.results:
+            self.results['warmup'] = dict()
+        if test not in self.results['warmup']:
+            self.results['warmup'][test] = dict()
+        self.results['warmup'][test][framework.name] = warmup
+
+    ############################################################
+    # report_open_loop_results
+    # Used by FrameworkTest to add the levels of an --open-loop
+    # run, one per request rate, and the peak they were based on
+    ############################################################
+    def report_open_loop_results(self, framework, test, results):
+        if not results or not results['results']:
+            return
+        if 'openLoop' not in self.results:
+            self.results['openLoop'] = dict()
+        if test not in self.results['openLoop']:
+            self.results['openLoop'][test] = dict()
+        self.results['openLoop'][test][framework.name] = {
+            'peakRate': results['peakRate'],
+            'levels': results['results']
+        }
+
     ############################################################
     # report_benchmark_results
     # Used by FrameworkTest to add benchmark data to this
@@ -576,8 +732,15 @@ class Benchmarker:
                     self.__write_intermediate_results(test.name,"<setup.py>#start() returned non-zero")
                     return exit_with_code(1)
 
-                logging.info("Sleeping %s seconds to ensure framework is ready" % self.sleep)
-                time.sleep(self.sleep)
+                logging.info("Waiting up to %s seconds for framework to be ready" % self.sleep)
+                time_to_ready = test.wait_until_ready(self.sleep)
+                if time_to_ready is None:
+                    out.write("WARNING: {name} was not ready after {sleep} seconds\n".format(name=test.name, sleep=self.sleep))
+                    out.flush()
+                else:
+                    logging.info("Framework was ready after %.1f seconds" % time_to_ready)
+                    self.report_ready_results(test, time_to_ready)
+                self.report_memory_results(test, 'ready', test.measure_memory())
 
                 ##########################
                 # Verify URLs
@@ -606,6 +769,7 @@ class Benchmarker:
                     out.write(header("Benchmarking %s" % test.name))
                     out.flush()
                     test.benchmark(logDir)
+                    self.report_memory_results(test, 'after', test.measure_memory())
 
                 ##########################
                 # Stop this test
@@ -615,6 +779,12 @@ class Benchmarker:
                 out.write(header("Stopped %s" % test.name))
                 out.flush()
 
+                ##########################
+                # Restart it to time startup
+                ##########################
+                if self.mode == "benchmark" and self.startup_runs > 0:
+                    self.__benchmark_startup(test, out)
+
                 ##########################################################
                 # Remove contents of  /tmp folder
                 ##########################################################
@@ -663,6 +833,52 @@ class Benchmarker:
     # End __run_tests
     ############################################################
 
+    ############################################################
+    # __benchmark_startup
+    # Restarts a framework startup_runs times, recording how long
+    # it took from spawning TFBReaper to bind its port and to
+    # first answer each of its URLs, see startup.
+    ############################################################
+    def __benchmark_startup(self, test, out):
+        out.write(header("Timing %d restarts of %s" % (self.startup_runs, test.name)))
+        out.flush()
+        base_url = "http://%s:%s" % (self.server_host, test.port)
+        runs = []
+        for run in xrange(self.startup_runs):
+            # Sockets of the last run may not have closed yet
+            waited = 0
+            while self.__is_port_bound(test.port) and waited < 60:
+                time.sleep(1)
+                waited += 1
+
+            watcher = startup.PortWatcher(test.port)
+            watcher.start()
+            result, self.__process = test.start(out)
+            if result != 0:
+                watcher.stop()
+                out.write("ERROR: Restart %d of %s failed\n" % (run + 1, test.name))
+                out.flush()
+                self.__stop_test(test, out)
+                break
+            responses = startup.first_responses(test.runTests, base_url, test.spawned_at, self.sleep)
+            watcher.stop()
+            runs.append({
+                'portBound': watcher.bound_at - test.spawned_at if watcher.bound_at is not None else None,
+                'firstResponse': responses
+            })
+            out.write("Restart %d: port bound after %s seconds, first responses after %s\n" % (
+                run + 1, runs[-1]['portBound'], responses))
+            out.flush()
+            self.__stop_test(test, out)
+
+        imports = test.measure_import_time(self.startup_runs, out)
+        if runs or imports is not None:
+            self.report_startup_results(test, runs, imports)
+
+    ############################################################
+    # End __benchmark_startup
+    ############################################################
+
     ############################################################
     # __stop_test
     # Attempts to stop the running test.
@@ -930,6 +1146,9 @@ class Benchmarker:
         types['update'] = UpdateTestType()
         types['plaintext'] = PlaintextTestType()
         types['cached_query'] = CachedQueryTestType()
+        types['churn'] = ChurnTestType()
+        types['stream'] = StreamTestType()
+        types['post'] = PostTestType()
 
         # Turn type into a map instead of a string
         if args['type'] == 'all':
@@ -964,6 +1183,8 @@ class Benchmarker:
 
         if hasattr(self, 'parse') and self.parse != None:
             self.timestamp = self.parse
+        elif hasattr(self, 'compare') and self.compare != None:
+            self.timestamp = self.compare[1]
         else:
             self.timestamp = time.strftime("%Y%m%d%H%M%S", time.localtime())
 
@@ -996,6 +1217,8 @@ class Benchmarker:
             self.results['concurrencyLevels'] = self.concurrency_levels
             self.results['queryIntervals'] = self.query_levels
             self.results['cachedQueryIntervals'] = self.cached_query_levels
+            self.results['streamSizes'] = self.stream_levels
+            self.results['postItems'] = self.post_levels
             self.results['frameworks'] = [t.name for t in self.__gather_tests]
             self.results['duration'] = self.duration
             self.results['rawData'] = dict()
@@ -1006,6 +1229,9 @@ class Benchmarker:
             self.results['rawData']['update'] = dict()
             self.results['rawData']['plaintext'] = dict()
             self.results['rawData']['cached_query'] = dict()
+            self.results['rawData']['churn'] = dict()
+            self.results['rawData']['stream'] = dict()
+            self.results['rawData']['post'] = dict()
             self.results['completed'] = dict()
             self.results['succeeded'] = dict()
             self.results['succeeded']['json'] = []
@@ -1015,6 +1241,9 @@ class Benchmarker:
             self.results['succeeded']['update'] = []
             self.results['succeeded']['plaintext'] = []
             self.results['succeeded']['cached_query'] = []
+            self.results['succeeded']['churn'] = []
+            self.results['succeeded']['stream'] = []
+            self.results['succeeded']['post'] = []
             self.results['failed'] = dict()
             self.results['failed']['json'] = []
             self.results['failed']['db'] = []
@@ -1023,7 +1252,15 @@ class Benchmarker:
             self.results['failed']['update'] = []
             self.results['failed']['plaintext'] = []
             self.results['failed']['cached_query'] = []
+            self.results['failed']['churn'] = []
+            self.results['failed']['stream'] = []
+            self.results['failed']['post'] = []
             self.results['verify'] = dict()
+            self.results['timeToReady'] = dict()
+            self.results['warmup'] = dict()
+            self.results['openLoop'] = dict()
+            self.results['memory'] = dict()
+            self.results['startup'] = dict()
         else:
             #for x in self.__gather_tests():
             #  if x.name not in self.results['frameworks']:
@@ -1,9 +1,17 @@
 from benchmark.fortune_html_parser import FortuneHTMLParser
+from benchmark import aggregation
+from benchmark import latency
+from benchmark import procstats
+from benchmark import profiler
+from benchmark import proctree
+from benchmark import startup
+from benchmark import stats as dstat
 from setup.linux import setup_util
 from benchmark.test_types import *
 
 import importlib
 import os
+import pipes
 import subprocess
 import socket
 import time
@@ -19,6 +27,7 @@ import math
 from collections import OrderedDict
 from requests import ConnectionError
 from threading import Thread
+from multiprocessing.pool import ThreadPool
 from threading import Event
 
 from utils import header
@@ -28,30 +37,76 @@ from colorama import Fore, Back, Style
 from datetime import datetime
 from datetime import timedelta
 
+# Patterns for the lines of a benchmark's raw output, see __parse_test
+_latency_line = re.compile(r"([0-9]+\.*[0-9]*[us|ms|s|m|%]+)")
+_percentile_line = re.compile(r"^\s+([0-9.]+)%\s+([0-9.]+[a-z]+)\s*$")
+_total_requests = re.compile(r"([0-9]+) requests in")
+_requests_summary = re.compile(r"([0-9]+) requests in ([0-9.]+[a-z]+), ([0-9.]+[KMGT]?B) read")
+_requests_per_second = re.compile(r"Requests/sec:\s+([0-9.]+)")
+_transfer_per_second = re.compile(r"Transfer/sec:\s+([0-9.]+[KMGT]?B)")
+_size = re.compile(r"^([0-9.]+)([KMGT]?)B$")
+_socket_errors = re.compile(r"(connect|read|write|timeout) ([0-9]+)")
+_non_2xx = re.compile(r"Non-2xx or 3xx responses: ([0-9]+)")
+_number = re.compile(r"[0-9]+")
+_level = re.compile(r"(?:Queries|Concurrency|Rate|Size|Items): ([0-9]+)")
+
+def _to_bytes(text):
+  '''Converts a wrk formatted size like "1.16MB" to bytes'''
+  m = _size.match(text)
+  return float(m.group(1)) * 1024 ** " KMGT".index(m.group(2) or " ")
+
 class FrameworkTest:
   headers_template = "-H 'Host: TFB-server' -H 'Accept: {accept}' -H 'Connection: keep-alive'"
-
-  # Used for test types that require no pipelining or query string params.
-  concurrency_template = """
-
-    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
-    echo ""
-    echo "---------------------------------------------------------"
-    echo " Running Primer {name}"
-    echo " {wrk} {headers} --latency -d 5 -c 8 --timeout 8 -t 8 \"http://{server_host}:{port}{url}\""
-    echo "---------------------------------------------------------"
-    echo ""
-    {wrk} {headers} --latency -d 5 -c 8 --timeout 8 -t 8 "http://{server_host}:{port}{url}"
-    sleep 5
-
+  churn_headers_template = "-H 'Host: TFB-server' -H 'Accept: {accept}' -H 'Connection: close'"
+
+  # Length in seconds of each warmup window, and how many of the
+  # latest windows must agree before the runtime counts as warm
+  warmup_window = 5
+  warmup_windows = 3
+
+  # Connections used at every response size of the stream test type
+  stream_concurrency = 16
+
+  # Warms the framework up at the highest concurrency until its
+  # throughput is steady: once the coefficient of variation of the
+  # last few windows is at most {warmup_cv}, or after {warmup_max}
+  # seconds. Included at the start of each of the templates below.
+  # {script} names a wrk script for test types that need one.
+  warmup_template = """
     echo ""
     echo "---------------------------------------------------------"
     echo " Running Warmup {name}"
-    echo " {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}\""
+    echo " {wrk} {headers} -d {window} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}\" {script} until steady"
     echo "---------------------------------------------------------"
     echo ""
-    {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}"
+    WARMUP_START=$(date +"%s")
+    rates=""
+    while true
+    do
+      rate=$({wrk} {headers} -d {window} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}" {script} | awk '/^Requests\/sec:/ {{ print $2 }}')
+      rates="$rates ${{rate:-0}}"
+      echo "WARMUP_WINDOW ${{rate:-0}}"
+      elapsed=$(($(date +"%s") - $WARMUP_START))
+      steady=$(echo $rates | awk -v n={windows} -v limit={warmup_cv} '{{
+        if (NF < n) {{ print 0; exit }}
+        sum = 0; for (i = NF - n + 1; i <= NF; i++) sum += $i; mean = sum / n
+        var = 0; for (i = NF - n + 1; i <= NF; i++) var += ($i - mean) ^ 2
+        print (mean > 0 && sqrt(var / n) / mean <= limit) ? 1 : 0
+      }}')
+      if [ "$steady" = "1" ] || [ $elapsed -ge {warmup_max} ]; then
+        break
+      fi
+    done
+    echo "WARMUP_TIME $elapsed"
+    echo "WARMUP_STEADY $steady"
     sleep 5
+"""
+
+  # Used for test types that require no pipelining or query string params.
+  concurrency_template = """
+
+    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+{warmup}
 
     echo ""
     echo "---------------------------------------------------------"
@@ -62,40 +117,62 @@ class FrameworkTest:
 
     for c in {levels}
     do
-      echo ""
-      echo "---------------------------------------------------------"
-      echo " Concurrency: $c for {name}"
-      echo " {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t $(($c>$max_threads?$max_threads:$c)) \"http://{server_host}:{port}{url}\""
-      echo "---------------------------------------------------------"
-      echo ""
-      STARTTIME=$(date +"%s")
-      {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t "$(($c>$max_threads?$max_threads:$c))" http://{server_host}:{port}{url}
-      echo "STARTTIME $STARTTIME"
-      echo "ENDTIME $(date +"%s")"
-      sleep 2
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Concurrency: $c for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t $(($c>$max_threads?$max_threads:$c)) \"http://{server_host}:{port}{url}\" -s ~/latency.lua"
+        echo "---------------------------------------------------------"
+        echo ""
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t "$(($c>$max_threads?$max_threads:$c))" http://{server_host}:{port}{url} -s ~/latency.lua
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
     done
   """
   # Used for test types that require pipelining.
   pipeline_template = """
 
     let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
-    echo ""
-    echo "---------------------------------------------------------"
-    echo " Running Primer {name}"
-    echo " {wrk} {headers} --latency -d 5 -c 8 --timeout 8 -t 8 \"http://{server_host}:{port}{url}\""
-    echo "---------------------------------------------------------"
-    echo ""
-    {wrk} {headers} --latency -d 5 -c 8 --timeout 8 -t 8 "http://{server_host}:{port}{url}"
-    sleep 5
+{warmup}
 
     echo ""
     echo "---------------------------------------------------------"
-    echo " Running Warmup {name}"
-    echo " {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}\""
+    echo " Synchronizing time"
     echo "---------------------------------------------------------"
     echo ""
-    {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}"
-    sleep 5
+    ntpdate -s pool.ntp.org
+
+    for c in {levels}
+    do
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Concurrency: $c for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t $(($c>$max_threads?$max_threads:$c)) \"http://{server_host}:{port}{url}\" -s ~/pipeline.lua -- {pipeline}"
+        echo "---------------------------------------------------------"
+        echo ""
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t "$(($c>$max_threads?$max_threads:$c))" http://{server_host}:{port}{url} -s ~/pipeline.lua -- {pipeline}
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
+    done
+  """
+  # Used for the churn test type. Every request is sent with
+  # Connection: close, so the load generator opens a new connection
+  # for each one. While each level runs, curl samples how long it
+  # takes to connect, which is how long the framework takes to
+  # accept a connection under that load.
+  churn_template = """
+
+    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+{warmup}
 
     echo ""
     echo "---------------------------------------------------------"
@@ -106,14 +183,53 @@ class FrameworkTest:
 
     for c in {levels}
     do
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Concurrency: $c for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t $(($c>$max_threads?$max_threads:$c)) \"http://{server_host}:{port}{url}\" -s ~/latency.lua"
+        echo "---------------------------------------------------------"
+        echo ""
+        output=$(mktemp)
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t "$(($c>$max_threads?$max_threads:$c))" http://{server_host}:{port}{url} -s ~/latency.lua > $output 2>&1 &
+        wrk_pid=$!
+        sleep 1
+        while kill -0 $wrk_pid 2> /dev/null
+        do
+          curl -s -o /dev/null -H 'Connection: close' -w "CONNECT_TIME %{{time_connect}}\n" "http://{server_host}:{port}{url}"
+          sleep 0.2
+        done
+        wait $wrk_pid
+        cat $output
+        rm -f $output
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
+    done
+  """
+  # Used by --open-loop. Sends requests at fixed rates, given as
+  # percent:rate pairs, and measures latency from when each request
+  # was due rather than when it was sent
+  open_loop_template = """
+    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+    echo "PEAK_RATE {peak}"
+
+    for level in {levels}
+    do
+      percent=${{level%%:*}}
+      rate=${{level##*:}}
       echo ""
       echo "---------------------------------------------------------"
-      echo " Concurrency: $c for {name}"
-      echo " {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t $(($c>$max_threads?$max_threads:$c)) \"http://{server_host}:{port}{url}\" -s ~/pipeline.lua -- {pipeline}"
+      echo " Rate: $percent% of {peak} requests/sec for {name}"
+      echo " {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads -R $rate \"http://{server_host}:{port}{url}\" {script}"
       echo "---------------------------------------------------------"
       echo ""
       STARTTIME=$(date +"%s")
-      {wrk} {headers} --latency -d {duration} -c $c --timeout 8 -t "$(($c>$max_threads?$max_threads:$c))" http://{server_host}:{port}{url} -s ~/pipeline.lua -- {pipeline}
+      {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads -R $rate "http://{server_host}:{port}{url}" {script}
+      echo "TARGET_RATE $rate"
       echo "STARTTIME $STARTTIME"
       echo "ENDTIME $(date +"%s")"
       sleep 2
@@ -124,23 +240,73 @@ class FrameworkTest:
   # the query sent with each request
   query_template = """
     let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+{warmup}
+
     echo ""
     echo "---------------------------------------------------------"
-    echo " Running Primer {name}"
-    echo " wrk {headers} --latency -d 5 -c 8 --timeout 8 -t 8 \"http://{server_host}:{port}{url}2\""
+    echo " Synchronizing time"
     echo "---------------------------------------------------------"
     echo ""
-    wrk {headers} --latency -d 5 -c 8 --timeout 8 -t 8 "http://{server_host}:{port}{url}2"
-    sleep 5
+    ntpdate -s pool.ntp.org
+
+    for c in {levels}
+    do
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Queries: $c for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}$c\" -s ~/latency.lua"
+        echo "---------------------------------------------------------"
+        echo ""
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}$c" -s ~/latency.lua
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
+    done
+  """
+
+  # Used for the stream test type - runs at a fixed concurrency and
+  # varies the size in bytes of each response. The timeout is long
+  # enough for the largest responses on a slow network.
+  stream_template = """
+    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+{warmup}
 
     echo ""
     echo "---------------------------------------------------------"
-    echo " Running Warmup {name}"
-    echo " wrk {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}2\""
+    echo " Synchronizing time"
     echo "---------------------------------------------------------"
     echo ""
-    wrk {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}2"
-    sleep 5
+    ntpdate -s pool.ntp.org
+
+    for s in {levels}
+    do
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Size: $s for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c {concurrency} --timeout 60 -t $(({concurrency}>$max_threads?$max_threads:{concurrency})) \"http://{server_host}:{port}{url}$s\" -s ~/latency.lua"
+        echo "---------------------------------------------------------"
+        echo ""
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c {concurrency} --timeout 60 -t "$(({concurrency}>$max_threads?$max_threads:{concurrency}))" "http://{server_host}:{port}{url}$s" -s ~/latency.lua
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
+    done
+  """
+
+  # Used for the post test type - runs at a static concurrency level
+  # and varies the number of items in the JSON body of each request,
+  # which ~/post.lua generates
+  post_template = """
+    let max_threads=$(cat /proc/cpuinfo | grep processor | wc -l)
+{warmup}
 
     echo ""
     echo "---------------------------------------------------------"
@@ -149,19 +315,22 @@ class FrameworkTest:
     echo ""
     ntpdate -s pool.ntp.org
 
-    for c in {levels}
+    for n in {levels}
     do
-      echo ""
-      echo "---------------------------------------------------------"
-      echo " Queries: $c for {name}"
-      echo " wrk {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}$c\""
-      echo "---------------------------------------------------------"
-      echo ""
-      STARTTIME=$(date +"%s")
-      wrk {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}$c"
-      echo "STARTTIME $STARTTIME"
-      echo "ENDTIME $(date +"%s")"
-      sleep 2
+      for r in $(seq 1 {repetitions})
+      do
+        echo ""
+        echo "---------------------------------------------------------"
+        echo " Items: $n for {name}, repetition $r of {repetitions}"
+        echo " {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads \"http://{server_host}:{port}{url}\" -s ~/post.lua -- $n"
+        echo "---------------------------------------------------------"
+        echo ""
+        STARTTIME=$(date +"%s")
+        {wrk} {headers} --latency -d {duration} -c {max_concurrency} --timeout 8 -t $max_threads "http://{server_host}:{port}{url}" -s ~/post.lua -- $n
+        echo "STARTTIME $STARTTIME"
+        echo "ENDTIME $(date +"%s")"
+        sleep 2
+      done
     done
   """
 
@@ -254,10 +423,13 @@ class FrameworkTest:
       out.flush()
 
     # Start the setup.sh command
+    self.spawned_at = time.time()
     p = subprocess.Popen(["%s/TFBReaper" % self.install_root,command],
           cwd=self.directory,
           stdout=subprocess.PIPE,
           stderr=subprocess.STDOUT)
+    # Every framework process descends from the reaper, see proctree
+    self.reaper_pid = p.pid
     nbsr = setup_util.NonBlockingStreamReader(p.stdout,
       "%s: %s.sh and framework processes have terminated" % (self.name, self.setup_file))
 
@@ -359,6 +531,87 @@ class FrameworkTest:
   # End start
   ############################################################
 
+  ############################################################
+  # measure_memory()
+  # Returns the total RSS, USS and PSS in bytes of the
+  # framework's processes right now, see procstats.snapshot
+  ############################################################
+  def measure_memory(self):
+    return procstats.snapshot(proctree.framework(self.reaper_pid, self.port))
+
+  ############################################################
+  # measure_import_time(runs, out)
+  # Imports import_module in a fresh interpreter of the test's
+  # flavor runs times, see startup. Returns the seconds each
+  # import took and the modules -X importtime found slowest in
+  # the first run, or None if the test has no import_module.
+  ############################################################
+  def measure_import_time(self, runs, out):
+    if not self.import_module:
+      return None
+    flavor = self.flavor.lower()
+    if flavor.startswith('pypy'):
+      (installed, python) = ('pypy.installed', 'pypy')
+    elif flavor == 'python3':
+      (installed, python) = ('py3.installed', 'python3')
+    else:
+      (installed, python) = ('py2.installed', 'python')
+
+    command = 'source %s && %s -c "%s"' % (
+      os.path.join(self.install_root, installed), python, startup.import_command(self.import_module))
+    env = dict(os.environ, PYTHONPROFILEIMPORTTIME='1')
+    seconds = []
+    slowest = None
+    for _ in xrange(runs):
+      p = subprocess.Popen(['bash', '-c', command], cwd=self.directory, env=env,
+                           stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+      output = p.communicate()[0]
+      imported = startup.parse_import_time(output)
+      if p.returncode != 0 or imported is None:
+        out.write("Could not import %s:\n%s\n" % (self.import_module, output))
+        out.flush()
+        break
+      seconds.append(imported)
+      if slowest is None:
+        slowest = startup.parse_importtime(output)
+    return {
+      'module': self.import_module,
+      'seconds': seconds,
+      'slowest': slowest or []
+    }
+
+  ############################################################
+  # wait_until_ready(timeout)
+  # A bound port does not mean the framework can answer yet.
+  # Polls the URL of every test type, backing off between
+  # failed attempts, until all of them have answered with a 200
+  # several times in a row. Returns the number of seconds this
+  # took, or None if the framework was not ready after timeout
+  # seconds.
+  ############################################################
+  def wait_until_ready(self, timeout, required_passes=3):
+    base_url = "http://%s:%s" % (self.benchmarker.server_host, self.port)
+    started = time.time()
+    delay = 0.1
+    passes = 0
+
+    while True:
+      if all(test.probe(base_url) for test in self.runTests.values()):
+        passes += 1
+        if passes >= required_passes:
+          return time.time() - started
+        delay = 0.1
+      else:
+        passes = 0
+        delay = min(delay * 2, 5)
+
+      if time.time() - started + delay > timeout:
+        return None
+      time.sleep(delay)
+  ############################################################
+  # End wait_until_ready
+  ############################################################
+
   ############################################################
   # verify_urls
   # Verifys each of the URLs for this test. THis will sinply
@@ -368,74 +621,93 @@ class FrameworkTest:
   # Returns True if all verifications succeeded
   ############################################################
   def verify_urls(self, logPath):
-    result = True
+    base_url = "http://%s:%s" % (self.benchmarker.server_host, self.port)
+    verifications = dict()
+    results = dict()
 
     def verify_type(test_type):
+      test = self.runTests[test_type]
+      test.setup_out(verifications[test_type])
+      verifications[test_type].write(header("VERIFYING %s" % test_type.upper()))
+
+      try:
+        # Verifies headers from the server. This check is made from the
+        # App Server using Pythons requests module. The client machine
+        # checks that it can reach the server afterwards, see below.
+        return test.verify(base_url)
+      except ConnectionError as e:
+        logging.warning("Verifying test %s for %s caused an exception: %s", test_type, self.name, e)
+        return [('fail',"Server did not respond to request", base_url)]
+      except Exception as e:
+        logging.warning("Verifying test %s for %s caused an exception: %s", test_type, self.name, e)
+        return [('fail',"""Caused Exception in TFB
+          This almost certainly means your return value is incorrect,
+          but also that you have found a bug. Please submit an issue
+          including this message: %s\n%s""" % (e, traceback.format_exc()),
+          base_url)]
+
+    def output_result(test, verification, result, reason, url):
+      specific_rules_url = "http://frameworkbenchmarks.readthedocs.org/en/latest/Project-Information/Framework-Tests/#specific-test-requirements"
+      color = Fore.GREEN
+      if result.upper() == "WARN":
+        color = Fore.YELLOW
+      elif result.upper() == "FAIL":
+        color = Fore.RED
+
+      verification.write(("   " + color + "%s" + Style.RESET_ALL + " for %s\n") % (result.upper(), url))
+      print ("   " + color + "%s" + Style.RESET_ALL + " for %s\n") % (result.upper(), url)
+      if reason is not None and len(reason) != 0:
+        for line in reason.splitlines():
+          verification.write("     " + line + '\n')
+          print "     " + line
+        if not test.passed:
+          verification.write("     See %s\n" % specific_rules_url)
+          print "     See %s\n" % specific_rules_url
+
+    for test_type in self.runTests:
       verificationPath = os.path.join(logPath, test_type)
       try:
         os.makedirs(verificationPath)
       except OSError:
         pass
-      with open(os.path.join(verificationPath, 'verification.txt'), 'w') as verification:
+      verifications[test_type] = open(os.path.join(verificationPath, 'verification.txt'), 'w')
+
+    try:
+      # The test types are independent, so they are all verified at
+      # once. Each one logs to its own verification.txt
+      test_types = list(self.runTests)
+      pool = ThreadPool(max(1, len(test_types)))
+      try:
+        for test_type, type_results in zip(test_types, pool.map(verify_type, test_types)):
+          results[test_type] = type_results
+      finally:
+        pool.close()
+
+      # Now verify that the urls are reachable from the client machine,
+      # unless we're already failing, to make sure the server isn't only
+      # accepting connections from localhost on a multi-machine setup
+      reachable = [test_type for test_type in test_types
+        if not any(result == 'fail' for (result, reason, url) in results[test_type])]
+      for test_type in self.__unreachable_from_client(base_url, reachable):
+        results[test_type] = [('fail', "Server did not respond to request from client machine.", base_url)]
+        logging.warning("""This error usually means your server is only accepting
+          requests from localhost.""")
+
+      result = True
+      for test_type in test_types:
         test = self.runTests[test_type]
-        test.setup_out(verification)
-        verification.write(header("VERIFYING %s" % test_type.upper()))
+        verification = verifications[test_type]
+        type_results = results[test_type]
 
-        base_url = "http://%s:%s" % (self.benchmarker.server_host, self.port)
+        test.failed = any(result == 'fail' for (result, reason, url) in type_results)
+        test.warned = any(result == 'warn' for (result, reason, url) in type_results)
+        test.passed = all(result == 'pass' for (result, reason, url) in type_results)
 
-        try:
-          # Verifies headers from the server. This check is made from the
-          # App Server using Pythons requests module. Will do a second check from
-          # the client to make sure the server isn't only accepting connections
-          # from localhost on a multi-machine setup.
-          results = test.verify(base_url)
-
-          # Now verify that the url is reachable from the client machine, unless
-          # we're already failing
-          if not any(result == 'fail' for (result, reason, url) in results):
-            p = subprocess.call(["ssh", "TFB-client", "curl -sSf %s" % base_url + test.get_url()], shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            if p is not 0:
-              results = [('fail', "Server did not respond to request from client machine.", base_url)]
-              logging.warning("""This error usually means your server is only accepting
-                requests from localhost.""")
-        except ConnectionError as e:
-          results = [('fail',"Server did not respond to request", base_url)]
-          logging.warning("Verifying test %s for %s caused an exception: %s", test_type, self.name, e)
-        except Exception as e:
-          results = [('fail',"""Caused Exception in TFB
-            This almost certainly means your return value is incorrect,
-            but also that you have found a bug. Please submit an issue
-            including this message: %s\n%s""" % (e, traceback.format_exc()),
-            base_url)]
-          logging.warning("Verifying test %s for %s caused an exception: %s", test_type, self.name, e)
-          traceback.format_exc()
-
-        test.failed = any(result == 'fail' for (result, reason, url) in results)
-        test.warned = any(result == 'warn' for (result, reason, url) in results)
-        test.passed = all(result == 'pass' for (result, reason, url) in results)
-
-        def output_result(result, reason, url):
-          specific_rules_url = "http://frameworkbenchmarks.readthedocs.org/en/latest/Project-Information/Framework-Tests/#specific-test-requirements"
-          color = Fore.GREEN
-          if result.upper() == "WARN":
-            color = Fore.YELLOW
-          elif result.upper() == "FAIL":
-            color = Fore.RED
-
-          verification.write(("   " + color + "%s" + Style.RESET_ALL + " for %s\n") % (result.upper(), url))
-          print ("   " + color + "%s" + Style.RESET_ALL + " for %s\n") % (result.upper(), url)
-          if reason is not None and len(reason) != 0:
-            for line in reason.splitlines():
-              verification.write("     " + line + '\n')
-              print "     " + line
-            if not test.passed:
-              verification.write("     See %s\n" % specific_rules_url)
-              print "     See %s\n" % specific_rules_url
-
-        [output_result(r1,r2,url) for (r1, r2, url) in results]
+        [output_result(test, verification, r1, r2, url) for (r1, r2, url) in type_results]
 
         if test.failed:
           self.benchmarker.report_verify_results(self, test_type, 'fail')
+          result = False
         elif test.warned:
           self.benchmarker.report_verify_results(self, test_type, 'warn')
         elif test.passed:
@@ -444,18 +716,36 @@ class FrameworkTest:
           raise Exception("Unknown error - test did not pass,warn,or fail")
 
         verification.flush()
-
-    result = True
-    for test_type in self.runTests:
-      verify_type(test_type)
-      if self.runTests[test_type].failed:
-        result = False
+    finally:
+      for verification in verifications.values():
+        verification.close()
 
     return result
   ############################################################
   # End verify_urls
   ############################################################
 
+  ############################################################
+  # __unreachable_from_client(base_url, test_types)
+  # Requests the URL of each of the test types from the client
+  # machine, all in one ssh session, and returns those that did
+  # not get an HTTP response. Only whether the server can be
+  # reached is checked; the responses were verified already.
+  ############################################################
+  def __unreachable_from_client(self, base_url, test_types):
+    if not test_types:
+      return []
+    command = "; ".join("curl -sS -o /dev/null %s || echo %s" % (
+      pipes.quote(base_url + self.runTests[test_type].get_probe_url()), pipes.quote("UNREACHABLE " + test_type))
+      for test_type in test_types)
+    p = subprocess.Popen(["ssh", "TFB-client", command], shell=False, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    (output, _) = p.communicate()
+    if p.returncode == 255:
+      # ssh itself failed
+      return test_types
+    unreachable = set(line.split(None, 1)[1] for line in output.splitlines() if line.startswith("UNREACHABLE "))
+    return [test_type for test_type in test_types if test_type in unreachable]
+
   ############################################################
   # benchmark
   # Runs the benchmark for each type of test that it implements
@@ -481,32 +771,55 @@ class FrameworkTest:
             pass
 
         if not test.failed:
+          (wrk_command, shell_command) = self.__load_generator_commands()
           if test_type == 'plaintext': # One special case
-            remote_script = self.__generate_pipeline_script(test.get_url(), self.port, test.accept_header)
+            remote_script = self.__generate_pipeline_script(test.get_url(), self.port, test.accept_header, wrk_command)
           elif test_type == 'query' or test_type == 'update':
-            remote_script = self.__generate_query_script(test.get_url(), self.port, test.accept_header, self.benchmarker.query_levels)
+            remote_script = self.__generate_query_script(test.get_url(), self.port, test.accept_header, self.benchmarker.query_levels, wrk_command)
           elif test_type == 'cached_query':
-            remote_script = self.__generate_query_script(test.get_url(), self.port, test.accept_header, self.benchmarker.cached_query_levels)
+            remote_script = self.__generate_query_script(test.get_url(), self.port, test.accept_header, self.benchmarker.cached_query_levels, wrk_command)
+          elif test_type == 'churn':
+            remote_script = self.__generate_churn_script(test.get_url(), self.port, test.accept_header, wrk_command)
+          elif test_type == 'stream':
+            remote_script = self.__generate_stream_script(test.get_url(), self.port, test.accept_header, self.benchmarker.stream_levels, wrk_command)
+          elif test_type == 'post':
+            remote_script = self.__generate_post_script(test.get_url(), self.port, test.accept_header, self.benchmarker.post_levels, wrk_command)
           else:
-            remote_script = self.__generate_concurrency_script(test.get_url(), self.port, test.accept_header)
+            remote_script = self.__generate_concurrency_script(test.get_url(), self.port, test.accept_header, wrk_command)
 
           # Begin resource usage metrics collection
           self.__begin_logging(test_type)
 
+          # Sample the framework's stacks, see --profile
+          sampler = None
+          if self.benchmarker.profile and self.reaper_pid is not None:
+            sampler = profiler.Profiler(self.reaper_pid, os.path.dirname(output_file), out)
+            sampler.start()
+
           # Run the benchmark
           with open(output_file, 'w') as raw_file:
-            p = subprocess.Popen(self.benchmarker.client_ssh_string.split(" "), stdin=subprocess.PIPE, stdout=raw_file, stderr=raw_file)
+            p = subprocess.Popen(shell_command, stdin=subprocess.PIPE, stdout=raw_file, stderr=raw_file)
             p.communicate(remote_script)
             out.flush()
 
           # End resource usage metrics collection
           self.__end_logging()
 
+          if sampler is not None:
+            folded = sampler.stop()
+            out.write("Collapsed stacks written to %s\n" % folded if folded else "Nothing was profiled\n")
+
         results = self.__parse_test(test_type)
         print "Benchmark results:"
         pprint(results)
 
         self.benchmarker.report_benchmark_results(framework=self, test=test_type, results=results['results'])
+        self.benchmarker.report_warmup_results(framework=self, test=test_type, warmup=results['warmup'])
+        self.benchmarker.report_level_memory_results(framework=self, test=test_type, results=results['results'])
+
+        if self.benchmarker.open_loop and not test.failed:
+          self.__benchmark_open_loop(test_type, test, results['results'], out)
+
         out.write( "Complete\n" )
         out.flush()
 
@@ -525,6 +838,11 @@ class FrameworkTest:
       if os.path.exists(self.benchmarker.get_output_file(self.name, test_type)):
         results = self.__parse_test(test_type)
         self.benchmarker.report_benchmark_results(framework=self, test=test_type, results=results['results'])
+        self.benchmarker.report_warmup_results(framework=self, test=test_type, warmup=results['warmup'])
+        self.benchmarker.report_level_memory_results(framework=self, test=test_type, results=results['results'])
+      if os.path.exists(self.__get_open_loop_file(test_type)):
+        results = self.__parse_test(test_type, open_loop=True)
+        self.benchmarker.report_open_loop_results(framework=self, test=test_type, results=results)
 
   ##########################################################################################
   # Private Methods
@@ -532,22 +850,50 @@ class FrameworkTest:
 
   ############################################################
   # __parse_test(test_type)
+  # With open_loop, parses the output of --open-loop instead,
+  # which has a level per request rate and no resource stats
   ############################################################
-  def __parse_test(self, test_type):
+  def __parse_test(self, test_type, open_loop=False):
     try:
       results = dict()
       results['results'] = []
-      stats = []
+      results['warmup'] = None
+      all_stats = None
+      process_stats = None
 
-      if os.path.exists(self.benchmarker.get_output_file(self.name, test_type)):
-        with open(self.benchmarker.output_file(self.name, test_type)) as raw_data:
+      output_file = self.benchmarker.get_output_file(self.name, test_type)
+      if open_loop:
+        output_file = self.__get_open_loop_file(test_type)
+        results['peakRate'] = None
+
+      if os.path.exists(output_file):
+        with open(output_file) as raw_data:
           is_warmup = True
           rawData = None
+          level = None
           for line in raw_data:
 
-            if "Queries:" in line or "Concurrency:" in line:
+            # Printed by warmup_template, see __generate_warmup_script
+            if line.startswith("WARMUP_"):
+              if results['warmup'] == None:
+                results['warmup'] = {'windows': []}
+              (key, value) = line.split()[:2]
+              if key == "WARMUP_WINDOW":
+                results['warmup']['windows'].append(float(value))
+              elif key == "WARMUP_TIME":
+                results['warmup']['time'] = int(value)
+              elif key == "WARMUP_STEADY":
+                results['warmup']['steady'] = value == "1"
+              continue
+
+            if line.startswith("PEAK_RATE"):
+              results['peakRate'] = float(line.split()[1])
+              continue
+
+            if "Queries:" in line or "Concurrency:" in line or "Rate:" in line or "Size:" in line or "Items:" in line:
               is_warmup = False
               rawData = None
+              level = _level.search(line)
               continue
             if "Warmup" in line or "Primer" in line:
               is_warmup = True
@@ -556,21 +902,54 @@ class FrameworkTest:
             if not is_warmup:
               if rawData == None:
                 rawData = dict()
+                if level != None:
+                  rawData['level'] = int(level.group(1))
                 results['results'].append(rawData)
 
-              #if "Requests/sec:" in line:
-              #  m = re.search("Requests/sec:\s+([0-9]+)", line)
-              #  rawData['reportedResults'] = m.group(1)
+              if "Requests/sec:" in line:
+                m = _requests_per_second.search(line)
+                if m != None:
+                  rawData['requestsPerSecond'] = float(m.group(1))
+              if "Transfer/sec:" in line:
+                m = _transfer_per_second.search(line)
+                if m != None:
+                  rawData['bytesPerSecond'] = _to_bytes(m.group(1))
 
               # search for weighttp data such as succeeded and failed.
               if "Latency" in line:
-                m = re.findall("([0-9]+\.*[0-9]*[us|ms|s|m|%]+)", line)
+                m = _latency_line.findall(line)
                 if len(m) == 4:
                   rawData['latencyAvg'] = m[0]
                   rawData['latencyStdev'] = m[1]
                   rawData['latencyMax'] = m[2]
+                  rawData['latency'] = {
+                    'mean': latency.to_microseconds(m[0]),
+                    'stdev': latency.to_microseconds(m[1]),
+                    'max': latency.to_microseconds(m[2]),
+                    'percentiles': dict()
+                  }
               #    rawData['latencyStdevPercent'] = m[3]
 
+              # wrk --latency distribution, e.g. "     99%    1.20ms"
+              m = _percentile_line.match(line)
+              if m != None and 'latency' in rawData:
+                # wrk2 prints "99.900%", wrk "99%"
+                rawData['latency']['percentiles']["%g" % float(m.group(1))] = latency.to_microseconds(m.group(2))
+
+              # Exact figures in microseconds, printed by latency.lua
+              if line.startswith("LATENCY_STATS") and 'latency' in rawData:
+                (min_us, max_us, mean_us, stdev_us) = line.split()[1:5]
+                rawData['latency']['min'] = float(min_us)
+                rawData['latency']['max'] = float(max_us)
+                rawData['latency']['mean'] = float(mean_us)
+                rawData['latency']['stdev'] = float(stdev_us)
+              if line.startswith("LATENCY_PERCENTILE") and 'latency' in rawData:
+                (p, value) = line.split()[1:3]
+                rawData['latency']['percentiles'][p] = float(value)
+              if line.startswith("LATENCY_HISTOGRAM") and 'latency' in rawData:
+                histogram = [tuple(int(x) for x in pair.split(':')) for pair in line.split()[1:]]
+                rawData['latency']['histogram'] = latency.encode_histogram(histogram)
+
               #if "Req/Sec" in line:
               #  m = re.findall("([0-9]+\.*[0-9]*[k|%]*)", line)
               #  if len(m) == 4:
@@ -594,40 +973,66 @@ class FrameworkTest:
               #      rawData['total_time'] = float(raw_time[:len(raw_time)-1]) * 3600.0
 
               if "requests in" in line:
-                m = re.search("([0-9]+) requests in", line)
+                m = _total_requests.search(line)
                 if m != None:
                   rawData['totalRequests'] = int(m.group(1))
+                # wrk's own timing, e.g. "123456 requests in 15.00s, 17.42MB read"
+                m = _requests_summary.search(line)
+                if m != None:
+                  rawData['totalTime'] = latency.to_microseconds(m.group(2)) / 1000000.0
+                  rawData['bytesRead'] = _to_bytes(m.group(3))
 
               if "Socket errors" in line:
-                if "connect" in line:
-                  m = re.search("connect ([0-9]+)", line)
-                  rawData['connect'] = int(m.group(1))
-                if "read" in line:
-                  m = re.search("read ([0-9]+)", line)
-                  rawData['read'] = int(m.group(1))
-                if "write" in line:
-                  m = re.search("write ([0-9]+)", line)
-                  rawData['write'] = int(m.group(1))
-                if "timeout" in line:
-                  m = re.search("timeout ([0-9]+)", line)
-                  rawData['timeout'] = int(m.group(1))
+                for (kind, count) in _socket_errors.findall(line):
+                  rawData[kind] = int(count)
 
               if "Non-2xx" in line:
-                m = re.search("Non-2xx or 3xx responses: ([0-9]+)", line)
+                m = _non_2xx.search(line)
                 if m != None:
                   rawData['5xx'] = int(m.group(1))
+              if line.startswith("CONNECT_TIME"):
+                rawData.setdefault('connectTimes', []).append(float(line.split()[1]) * 1000000)
+              if line.startswith("TARGET_RATE"):
+                rawData['targetRate'] = float(line.split()[1])
               if "STARTTIME" in line:
-                m = re.search("[0-9]+", line)
+                m = _number.search(line)
                 rawData["startTime"] = int(m.group(0))
               if "ENDTIME" in line:
-                m = re.search("[0-9]+", line)
+                m = _number.search(line)
                 rawData["endTime"] = int(m.group(0))
-                test_stats = self.__parse_stats(test_type, rawData["startTime"], rawData["endTime"], 1)
-                # rawData["averageStats"] = self.__calculate_average_stats(test_stats)
-                stats.append(test_stats)
-      with open(self.benchmarker.stats_file(self.name, test_type) + ".json", "w") as stats_file:
-        json.dump(stats, stats_file, indent=2)
-
+                self.__calculate_throughput(rawData)
+                if test_type == 'stream' and 'bytesPerSecond' in rawData:
+                  rawData['megabytesPerSecond'] = rawData['bytesPerSecond'] / (1024.0 * 1024.0)
+                if 'connectTimes' in rawData:
+                  rawData['connectLatency'] = latency.summarize(rawData.pop('connectTimes'))
+                if open_loop:
+                  continue
+                # The stats file covers every level, so it is read once
+                # and cut into the window of each level
+                if all_stats is None:
+                  all_stats = self.__parse_stats(test_type)
+                  process_stats = self.__parse_process_stats(test_type)
+                all_stats.levels.append((rawData["startTime"], rawData["endTime"]))
+                test_stats = all_stats.window(rawData["startTime"], rawData["endTime"])
+                rawData["averageStats"] = self.__calculate_average_stats(test_stats)
+                processes = None
+                if process_stats is not None:
+                  processes = dstat.summarize_processes(process_stats.window(rawData["startTime"], rawData["endTime"]))
+                  rawData["processStats"] = processes
+                rawData["efficiency"] = dstat.efficiency(rawData.get('requestsPerSecond'), rawData["averageStats"], processes)
+      # Kept in a compact columnar file, read it with benchmark.stats.load
+      if all_stats is not None:
+        if process_stats is not None:
+          dstat.merge(all_stats, process_stats)
+        dstat.save(self.benchmarker.stats_file(self.name, test_type) + ".cols", all_stats)
+
+      # With --repetitions each level ran several times
+      results['results'] = aggregation.group_repetitions(results['results'])
+      if self.benchmarker.repetitions == 1 and not open_loop:
+        # The level was only needed to group the runs, and rawData
+        # had no level key before --repetitions
+        for rawData in results['results']:
+          rawData.pop('level', None)
 
       return results
     except IOError:
@@ -636,6 +1041,102 @@ class FrameworkTest:
   # End benchmark
   ############################################################
 
+  ############################################################
+  # __calculate_throughput(rawData)
+  # Fills in the throughput of a level once all of its output has
+  # been parsed:
+  # * duration - seconds from STARTTIME to ENDTIME
+  # * requestsPerSecond - as reported by the load generator, or
+  #   totalRequests over the duration if it reported none
+  # * bytesPerSecond - likewise, from Transfer/sec and bytes read
+  # * errorRate - socket errors and non 2xx/3xx responses, as a
+  #   fraction of the requests sent
+  ############################################################
+  def __calculate_throughput(self, rawData):
+    rawData['duration'] = rawData['endTime'] - rawData.get('startTime', rawData['endTime'])
+    elapsed = rawData.get('totalTime') or rawData['duration']
+
+    if 'requestsPerSecond' not in rawData and 'totalRequests' in rawData and elapsed > 0:
+      rawData['requestsPerSecond'] = rawData['totalRequests'] / float(elapsed)
+    if 'bytesPerSecond' not in rawData and 'bytesRead' in rawData and elapsed > 0:
+      rawData['bytesPerSecond'] = rawData['bytesRead'] / float(elapsed)
+
+    errors = sum(rawData.get(kind, 0) for kind in ('connect', 'read', 'write', 'timeout', '5xx'))
+    requests = rawData.get('totalRequests', 0)
+    if requests > 0:
+      rawData['errorRate'] = min(1.0, errors / float(requests))
+    elif errors > 0:
+      rawData['errorRate'] = 1.0
+
+  ############################################################
+  # __benchmark_open_loop(test_type, test, levels, out)
+  # Runs --open-loop for a test type once its closed loop
+  # benchmark is done. The request rates are percentages of the
+  # highest throughput that benchmark reached.
+  ############################################################
+  def __benchmark_open_loop(self, test_type, test, levels, out):
+    rates = [level.get('requestsPerSecond') for level in levels or []]
+    rates = [rate for rate in rates if rate]
+    if not rates:
+      out.write("No throughput to base the open loop rates on, skipping\n")
+      return
+    peak = max(rates)
+
+    (wrk_command, shell_command) = self.__load_generator_commands(open_loop=True)
+    url = test.get_url()
+    if test_type in ('query', 'update', 'cached_query'):
+      url += "2"
+    elif test_type == 'stream':
+      url += str(min(self.benchmarker.stream_levels))
+    script = ""
+    if test_type == 'post':
+      script = "-s ~/post.lua -- %d" % min(self.benchmarker.post_levels)
+    remote_script = self.__generate_open_loop_script(url, self.port, test.accept_header, peak, wrk_command, script)
+
+    with open(self.__get_open_loop_file(test_type), 'w') as raw_file:
+      p = subprocess.Popen(shell_command, stdin=subprocess.PIPE, stdout=raw_file, stderr=raw_file)
+      p.communicate(remote_script)
+      out.flush()
+
+    results = self.__parse_test(test_type, open_loop=True)
+    self.benchmarker.report_open_loop_results(framework=self, test=test_type, results=results)
+
+  ############################################################
+  # __get_open_loop_file(test_type)
+  # The output of --open-loop, kept beside raw.txt
+  ############################################################
+  def __get_open_loop_file(self, test_type):
+    return os.path.join(os.path.dirname(self.benchmarker.get_output_file(self.name, test_type)), "open_loop.txt")
+
+  ############################################################
+  # __load_generator_commands
+  # Returns the command that the benchmark scripts use in place
+  # of wrk, and the command that runs those scripts. wrk runs on
+  # the client machine over ssh. The asyncio load generator in
+  # toolset/loadgen runs on this machine, so no client is needed.
+  # Open loop runs need wrk2, which wrk lacks -R for.
+  ############################################################
+  def __load_generator_commands(self, open_loop=False):
+    if self.benchmarker.load_generator == 'asyncio':
+      python = os.path.join(self.install_root, 'py3', 'bin', 'python3')
+      if not os.path.exists(python):
+        python = 'python3'
+      wrk_command = "%s %s" % (python, os.path.join(self.fwroot, 'toolset', 'loadgen', 'aiowrk.py'))
+      return (wrk_command, ['bash'])
+    return ("wrk2" if open_loop else "wrk", self.benchmarker.client_ssh_string.split(" "))
+
+  ############################################################
+  # __generate_warmup_script(url, port)
+  # Generates the warmup that starts each benchmark script. It
+  # always runs at the highest concurrency level without
+  # pipelining, which is how the fixed warmup used to run.
+  ############################################################
+  def __generate_warmup_script(self, url, port, headers, wrk_command, script=""):
+    return self.warmup_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), script=script,
+      name=self.name, window=self.warmup_window, windows=self.warmup_windows,
+      warmup_cv=self.benchmarker.warmup_cv, warmup_max=self.benchmarker.warmup_max,
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command)
+
   ############################################################
   # __generate_concurrency_script(url, port)
   # Generates the string containing the bash script that will
@@ -645,10 +1146,26 @@ class FrameworkTest:
   ############################################################
   def __generate_concurrency_script(self, url, port, accept_header, wrk_command="wrk"):
     headers = self.headers_template.format(accept=accept_header)
-    return self.concurrency_template.format(max_concurrency=max(self.benchmarker.concurrency_levels),
+    warmup = self.__generate_warmup_script(url, port, headers, wrk_command)
+    return self.concurrency_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), warmup=warmup,
       name=self.name, duration=self.benchmarker.duration,
       levels=" ".join("{}".format(item) for item in self.benchmarker.concurrency_levels),
-      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command)
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
+      repetitions=self.benchmarker.repetitions)
+
+  ############################################################
+  # __generate_churn_script(url, port)
+  # Generates the script for the churn test type, which runs
+  # the concurrency levels without keep-alive
+  ############################################################
+  def __generate_churn_script(self, url, port, accept_header, wrk_command="wrk"):
+    headers = self.churn_headers_template.format(accept=accept_header)
+    warmup = self.__generate_warmup_script(url, port, headers, wrk_command)
+    return self.churn_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), warmup=warmup,
+      name=self.name, duration=self.benchmarker.duration,
+      levels=" ".join("{}".format(item) for item in self.benchmarker.concurrency_levels),
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
+      repetitions=self.benchmarker.repetitions)
 
   ############################################################
   # __generate_pipeline_script(url, port)
@@ -657,11 +1174,24 @@ class FrameworkTest:
   ############################################################
   def __generate_pipeline_script(self, url, port, accept_header, wrk_command="wrk"):
     headers = self.headers_template.format(accept=accept_header)
-    return self.pipeline_template.format(max_concurrency=16384,
+    warmup = self.__generate_warmup_script(url, port, headers, wrk_command)
+    return self.pipeline_template.format(max_concurrency=16384, warmup=warmup,
       name=self.name, duration=self.benchmarker.duration,
       levels=" ".join("{}".format(item) for item in [256,1024,4096,16384]),
       server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
-      pipeline=16)
+      pipeline=16, repetitions=self.benchmarker.repetitions)
+
+  ############################################################
+  # __generate_open_loop_script(url, port)
+  # Generates the script for --open-loop, which sends requests to
+  # url at each of --rate-levels percent of peak requests/sec
+  ############################################################
+  def __generate_open_loop_script(self, url, port, accept_header, peak, wrk_command, script=""):
+    headers = self.headers_template.format(accept=accept_header)
+    levels = ["%d:%d" % (percent, max(1, int(peak * percent / 100.0))) for percent in self.benchmarker.rate_levels]
+    return self.open_loop_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), script=script,
+      name=self.name, duration=self.benchmarker.duration, levels=" ".join(levels), peak=int(peak),
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command)
 
   ############################################################
   # __generate_query_script(url, port)
@@ -669,12 +1199,43 @@ class FrameworkTest:
   # be run on the client to benchmark a single test. This
   # specifically works for the variable query tests (Query)
   ############################################################
-  def __generate_query_script(self, url, port, accept_header, query_levels):
+  def __generate_query_script(self, url, port, accept_header, query_levels, wrk_command="wrk"):
     headers = self.headers_template.format(accept=accept_header)
-    return self.query_template.format(max_concurrency=max(self.benchmarker.concurrency_levels),
+    warmup = self.__generate_warmup_script(url + "2", port, headers, wrk_command)
+    return self.query_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), warmup=warmup,
       name=self.name, duration=self.benchmarker.duration,
       levels=" ".join("{}".format(item) for item in query_levels),
-      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers)
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
+      repetitions=self.benchmarker.repetitions)
+
+  ############################################################
+  # __generate_stream_script(url, port)
+  # Generates the script for the stream test type, which appends
+  # each of the response sizes in stream_levels to the url
+  ############################################################
+  def __generate_stream_script(self, url, port, accept_header, stream_levels, wrk_command="wrk"):
+    headers = self.headers_template.format(accept=accept_header)
+    warmup = self.__generate_warmup_script(url + str(min(stream_levels)), port, headers, wrk_command)
+    return self.stream_template.format(concurrency=self.stream_concurrency, warmup=warmup,
+      name=self.name, duration=self.benchmarker.duration,
+      levels=" ".join("{}".format(item) for item in stream_levels),
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
+      repetitions=self.benchmarker.repetitions)
+
+  ############################################################
+  # __generate_post_script(url, port)
+  # Generates the script for the post test type, which sends
+  # JSON bodies with each of the item counts in post_levels
+  ############################################################
+  def __generate_post_script(self, url, port, accept_header, post_levels, wrk_command="wrk"):
+    headers = self.headers_template.format(accept=accept_header)
+    warmup = self.__generate_warmup_script(url, port, headers, wrk_command,
+      script="-s ~/post.lua -- %d" % min(post_levels))
+    return self.post_template.format(max_concurrency=max(self.benchmarker.concurrency_levels), warmup=warmup,
+      name=self.name, duration=self.benchmarker.duration,
+      levels=" ".join("{}".format(item) for item in post_levels),
+      server_host=self.benchmarker.server_host, port=port, url=url, headers=headers, wrk=wrk_command,
+      repetitions=self.benchmarker.repetitions)
 
   ############################################################
   # Returns True if any test type this this framework test will use a DB
@@ -696,6 +1257,10 @@ class FrameworkTest:
     cmd = shlex.split(dstat_string)
     dev_null = open(os.devnull, "w")
     self.subprocess_handle = subprocess.Popen(cmd, stdout=dev_null, stderr=subprocess.STDOUT)
+    # dstat sees the whole host, this only the framework's processes
+    self.process_sampler = procstats.ProcessSampler(self.__get_process_stats_file(test_type),
+      root_pid=self.reaper_pid, port=self.port)
+    self.process_sampler.start()
 
   ##############################################################
   # Begin __end_logging
@@ -704,51 +1269,40 @@ class FrameworkTest:
   def __end_logging(self):
     self.subprocess_handle.terminate()
     self.subprocess_handle.communicate()
+    self.process_sampler.stop()
 
   ##############################################################
   # Begin __parse_stats
-  # For each test type, process all the statistics, and return a multi-layered dictionary
-  # that has a structure as follows:
-  # (timestamp)
-  # | (main header) - group that the stat is in
-  # | | (sub header) - title of the stat
-  # | | | (stat) - the stat itself, usually a floating point number
+  # Reads the resource usage recorded by dstat while the test
+  # type was benchmarked, in a single pass. Returns a stats.Stats,
+  # which holds one column of numbers per stat, e.g.
+  # column('memory usage', 'used'), alongside the sample times.
   ##############################################################
-  def __parse_stats(self, test_type, start_time, end_time, interval):
-    stats_dict = dict()
-    stats_file = self.benchmarker.stats_file(self.name, test_type)
-    with open(stats_file) as stats:
-      while(stats.next() != "\n"): # dstat doesn't output a completely compliant CSV file - we need to strip the header
-        pass
-      stats_reader = csv.reader(stats)
-      main_header = stats_reader.next()
-      sub_header = stats_reader.next()
-      time_row = sub_header.index("epoch")
-      int_counter = 0
-      for row in stats_reader:
-        time = float(row[time_row])
-        int_counter+=1
-        if time < start_time:
-          continue
-        elif time > end_time:
-          return stats_dict
-        if int_counter % interval != 0:
-          continue
-        row_dict = dict()
-        for nextheader in main_header:
-          if nextheader != "":
-            row_dict[nextheader] = dict()
-        header = ""
-        for item_num, column in enumerate(row):
-          if(len(main_header[item_num]) != 0):
-            header = main_header[item_num]
-          row_dict[header][sub_header[item_num]] = float(column) # all the stats are numbers, so we want to make sure that they stay that way in json
-        stats_dict[time] = row_dict
-    return stats_dict
+  def __parse_stats(self, test_type):
+    return dstat.read(self.benchmarker.stats_file(self.name, test_type))
   ##############################################################
   # End __parse_stats
   ##############################################################
 
+  ##############################################################
+  # __get_process_stats_file(test_type)
+  # The usage of the framework's own processes, see procstats,
+  # kept beside stats.txt
+  ##############################################################
+  def __get_process_stats_file(self, test_type):
+    return os.path.join(os.path.dirname(self.benchmarker.stats_file(self.name, test_type)), "processes.csv")
+
+  ##############################################################
+  # __parse_process_stats(test_type)
+  # Reads the file written by procstats.ProcessSampler, or returns
+  # None for results recorded without one
+  ##############################################################
+  def __parse_process_stats(self, test_type):
+    path = self.__get_process_stats_file(test_type)
+    if not os.path.exists(path):
+      return None
+    return dstat.read(path)
+
   def __getattr__(self, name):
     """For backwards compatibility, we used to pass benchmarker
     as the argument to the setup.sh files"""
@@ -764,70 +1318,19 @@ class FrameworkTest:
   # Begin __calculate_average_stats
   # We have a large amount of raw data for the statistics that
   # may be useful for the stats nerds, but most people care about
-  # a couple of numbers. For now, we're only going to supply:
-  # * Average CPU
-  # * Average Memory
-  # * Total network use
-  # * Total disk use
+  # a couple of numbers. For now, we're only going to supply the
+  # mean, 95th percentile and maximum of:
+  # * CPU use, in percent
+  # * Memory use, in bytes
+  # * Network use, received and sent in bytes per second
+  # * Disk use, read and written in bytes per second
   # More may be added in the future. If they are, please update
-  # the above list.
-  # Note: raw_stats is directly from the __parse_stats method.
-  # Recall that this consists of a dictionary of timestamps,
-  # each of which contain a dictionary of stat categories which
-  # contain a dictionary of stats
+  # the above list and benchmark.stats.summarize.
+  # Note: raw_stats is one level's window of the samples returned
+  # by the __parse_stats method.
   ##############################################################
   def __calculate_average_stats(self, raw_stats):
-    raw_stat_collection = dict()
-
-    for timestamp, time_dict in raw_stats.items():
-      for main_header, sub_headers in time_dict.items():
-        item_to_append = None
-        if 'cpu' in main_header:
-          # We want to take the idl stat and subtract it from 100
-          # to get the time that the CPU is NOT idle.
-          item_to_append = sub_headers['idl'] - 100.0
-        elif main_header == 'memory usage':
-          item_to_append = sub_headers['used']
-        elif 'net' in main_header:
-          # Network stats have two parts - recieve and send. We'll use a tuple of
-          # style (recieve, send)
-          item_to_append = (sub_headers['recv'], sub_headers['send'])
-        elif 'dsk' or 'io' in main_header:
-          # Similar for network, except our tuple looks like (read, write)
-          item_to_append = (sub_headers['read'], sub_headers['writ'])
-        if item_to_append is not None:
-          if main_header not in raw_stat_collection:
-            raw_stat_collection[main_header] = list()
-          raw_stat_collection[main_header].append(item_to_append)
-
-    # Simple function to determine human readable size
-    # http://stackoverflow.com/questions/1094841/reusable-library-to-get-human-readable-version-of-file-size
-    def sizeof_fmt(num):
-      # We'll assume that any number we get is convertable to a float, just in case
-      num = float(num)
-      for x in ['bytes','KB','MB','GB']:
-        if num < 1024.0 and num > -1024.0:
-          return "%3.1f%s" % (num, x)
-        num /= 1024.0
-      return "%3.1f%s" % (num, 'TB')
-
-    # Now we have our raw stats in a readable format - we need to format it for display
-    # We need a floating point sum, so the built in sum doesn't cut it
-    display_stat_collection = dict()
-    for header, values in raw_stat_collection.items():
-      display_stat = None
-      if 'cpu' in header:
-        display_stat = sizeof_fmt(math.fsum(values) / len(values))
-      elif main_header == 'memory usage':
-        display_stat = sizeof_fmt(math.fsum(values) / len(values))
-      elif 'net' in main_header:
-        receive, send = zip(*values) # unzip
-        display_stat = {'receive': sizeof_fmt(math.fsum(receive)), 'send': sizeof_fmt(math.fsum(send))}
-      else: # if 'dsk' or 'io' in header:
-        read, write = zip(*values) # unzip
-        display_stat = {'read': sizeof_fmt(math.fsum(read)), 'write': sizeof_fmt(math.fsum(write))}
-      display_stat_collection[header] = display_stat
-    return display_stat
+    return dstat.summarize(raw_stats)
   ###########################################################################################
   # End __calculate_average_stats
   #########################################################################################
@@ -861,6 +1364,14 @@ class FrameworkTest:
 
     self.install_root="%s/%s" % (self.fwroot, "installs")
 
+    # Set by start
+    self.reaper_pid = None
+    self.spawned_at = None
+
+    # The module whose import time --startup-runs measures
+    self.import_module = None
+    self.flavor = ""
+
     # Used in setup.sh scripts for consistency with
     # the bash environment variables
     self.troot = self.directory
@@ -900,10 +1411,13 @@ def validate_urls(test_name, test_keys):
     "fortune_url":      "/mysql/fortunes",
     "update_url":       "/mysql/updates?queries=  or  /mysql/updates/",
     "plaintext_url":    "/plaintext",
-    "cached_query_url": "/mysql/cached_queries?queries=  or /mysql/cached_queries"
+    "cached_query_url": "/mysql/cached_queries?queries=  or /mysql/cached_queries",
+    "churn_url":        "/plaintext",
+    "stream_url":       "/stream?size=  or  /stream/",
+    "post_url":         "/post"
   }
 
-  for test_url in ["json_url","db_url","query_url","fortune_url","update_url","plaintext_url","cached_query_url"]:
+  for test_url in ["json_url","db_url","query_url","fortune_url","update_url","plaintext_url","cached_query_url","churn_url","stream_url","post_url"]:
     key_value = test_keys.get(test_url, None)
     if key_value != None and not key_value.startswith('/'):
       errmsg = """`%s` field in test \"%s\" does not appear to be a valid url: \"%s\"\n
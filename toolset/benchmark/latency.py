@@ -0,0 +1,130 @@
+'''
+Helpers for the latency data reported by the load generator.
+
+wrk prints human formatted figures such as "1.25ms". With
+~/latency.lua loaded (see toolset/setup/linux/client.sh) it also
+prints machine readable lines at the end of each run:
+
+  LATENCY_STATS <min> <max> <mean> <stdev>
+  LATENCY_PERCENTILE <percentile> <value>
+  LATENCY_HISTOGRAM <value>:<count> <value>:<count> ...
+
+All values are microseconds. The histogram is bucketed to three
+significant digits, like HdrHistogram, and is stored in
+results.json as a compact blob (see encode_histogram).
+'''
+import base64
+import re
+import struct
+import zlib
+
+# Percentiles reported for every run, as strings so they can be
+# used directly as JSON keys
+PERCENTILES = ['50', '75', '90', '99', '99.9', '99.99']
+
+# Bumped if the layout produced by encode_histogram changes
+HISTOGRAM_VERSION = 1
+
+_units = {'us': 1.0, 'ms': 1000.0, 's': 1000000.0, 'm': 60000000.0, 'h': 3600000000.0}
+_duration = re.compile(r"^([0-9]+(?:\.[0-9]*)?)(us|ms|s|m|h)$")
+
+
+def to_microseconds(text):
+    '''
+    Converts a wrk formatted duration like "635.91us" or "1.2ms"
+    to a number of microseconds. Returns None if the text is not
+    a duration
+    '''
+    m = _duration.match(text.strip())
+    if m is None:
+        return None
+    return float(m.group(1)) * _units[m.group(2)]
+
+
+def _write_varint(out, value):
+    while value >= 0x80:
+        out.append(chr((value & 0x7f) | 0x80))
+        value >>= 7
+    out.append(chr(value))
+
+
+def _read_varint(data, pos):
+    value = 0
+    shift = 0
+    while True:
+        byte = ord(data[pos])
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+
+def encode_histogram(histogram):
+    '''
+    Encodes a list of (value, count) pairs sorted by value into a
+    short ASCII string. Values are delta encoded, written as
+    varints along with their counts, deflated and base64 encoded
+    '''
+    out = [struct.pack('>B', HISTOGRAM_VERSION)]
+    previous = 0
+    for value, count in histogram:
+        value = int(value)
+        _write_varint(out, value - previous)
+        _write_varint(out, int(count))
+        previous = value
+    return base64.b64encode(zlib.compress(''.join(out), 9))
+
+
+def decode_histogram(blob):
+    '''
+    Inverse of encode_histogram. Returns a list of (value, count)
+    pairs sorted by value
+    '''
+    data = zlib.decompress(base64.b64decode(blob))
+    version = struct.unpack('>B', data[0])[0]
+    if version != HISTOGRAM_VERSION:
+        raise ValueError("Unknown latency histogram version %s" % version)
+    histogram = []
+    value = 0
+    pos = 1
+    while pos < len(data):
+        delta, pos = _read_varint(data, pos)
+        count, pos = _read_varint(data, pos)
+        value += delta
+        histogram.append((value, count))
+    return histogram
+
+
+def summarize(samples):
+    '''
+    Summarizes a list of individual samples, such as connect times,
+    as their count, mean, median, 99th percentile and maximum
+    '''
+    if not samples:
+        return None
+    histogram = [(value, 1) for value in sorted(samples)]
+    return {
+        'samples': len(samples),
+        'mean': sum(samples) / float(len(samples)),
+        'p50': percentile(histogram, 50),
+        'p99': percentile(histogram, 99),
+        'max': histogram[-1][0]
+    }
+
+
+def percentile(histogram, p):
+    '''
+    Returns the value at percentile p (0-100) of a list of
+    (value, count) pairs sorted by value
+    '''
+    total = sum(count for _, count in histogram)
+    if total == 0:
+        return None
+    wanted = total * float(p) / 100.0
+    seen = 0
+    for value, count in histogram:
+        seen += count
+        if seen >= wanted:
+            return value
+    return histogram[-1][0]
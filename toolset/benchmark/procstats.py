@@ -0,0 +1,209 @@
+'''
+Samples the resource usage of the framework's own processes while a
+test type is benchmarked (see FrameworkTest.__begin_logging). dstat
+measures the whole host, so its figures include the database, the
+toolset and dstat itself; these only count the processes proctree
+finds for the framework.
+
+Once a second the sampler reads /proc for every framework process and
+its threads and writes one row to a CSV file laid out like dstat's,
+so that stats.read reads it too. The stats are all in the group
+"framework":
+
+  processes, threads, fds  - how many there were
+  rss                      - resident memory of all of them, in bytes
+                             (pages shared by forked workers are
+                             counted once per worker)
+  max rss                  - resident memory of the largest one
+  uss                      - memory private to each of them, summed:
+                             what would be freed if they all exited
+  cpu                      - cpu time used, in percent of one core
+  voluntary, involuntary   - context switches per second
+'''
+import csv
+import os
+import threading
+import time
+
+from benchmark import proctree
+
+GROUP = 'framework'
+NAMES = ['processes', 'threads', 'fds', 'rss', 'max rss', 'uss', 'cpu', 'voluntary', 'involuntary']
+
+# Seconds between samples, like dstat's default
+INTERVAL = 1.0
+
+_ticks = os.sysconf('SC_CLK_TCK')
+_page_size = os.sysconf('SC_PAGE_SIZE')
+
+
+def _switches(pid):
+    '''
+    Voluntary and involuntary context switches of all of the threads
+    of a process. /proc/<pid>/status only counts its main thread
+    '''
+    voluntary = involuntary = 0
+    directory = '/proc/%d/task' % pid
+    for task in os.listdir(directory):
+        try:
+            with open(os.path.join(directory, task, 'status')) as f:
+                for line in f:
+                    if line.startswith('voluntary_ctxt_switches'):
+                        voluntary += int(line.split()[1])
+                    elif line.startswith('nonvoluntary_ctxt_switches'):
+                        involuntary += int(line.split()[1])
+        except (IOError, OSError):
+            continue
+    return (voluntary, involuntary)
+
+
+def private_memory(pid):
+    '''
+    Returns the unique set size (USS) and proportional set size (PSS)
+    of a process in bytes. smaps_rollup is much cheaper to read, but
+    older kernels only have smaps
+    '''
+    uss = pss = 0
+    for name in ('smaps_rollup', 'smaps'):
+        try:
+            f = open('/proc/%d/%s' % (pid, name))
+        except (IOError, OSError):
+            continue
+        with f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    uss += int(line.split()[1]) * 1024
+                elif line.startswith('Pss:'):
+                    pss += int(line.split()[1]) * 1024
+        return (uss, pss)
+    raise IOError("No smaps for process %d" % pid)
+
+
+def snapshot(pids):
+    '''
+    The memory of a framework's processes at one moment, in bytes
+    '''
+    memory = {'processes': 0, 'rss': 0, 'uss': 0, 'pss': 0}
+    for pid in pids:
+        try:
+            rss = int(proctree._stat(pid)[21]) * _page_size
+        except (IOError, OSError, ValueError, IndexError):
+            # It exited
+            continue
+        try:
+            (uss, pss) = private_memory(pid)
+        except (IOError, OSError):
+            # smaps of another user's process, e.g. a root nginx master
+            (uss, pss) = (0, 0)
+        memory['processes'] += 1
+        memory['rss'] += rss
+        memory['uss'] += uss
+        memory['pss'] += pss
+    return memory
+
+
+def usage(pid):
+    '''
+    Returns a dict of the counters of one process: cpu seconds used so
+    far, context switches so far, and its current threads, open file
+    descriptors, and resident and private memory in bytes
+    '''
+    fields = proctree._stat(pid)
+    (voluntary, involuntary) = _switches(pid)
+    try:
+        (uss, _) = private_memory(pid)
+    except (IOError, OSError):
+        # smaps of another user's process, e.g. a root nginx master
+        uss = 0
+    try:
+        fds = len(os.listdir('/proc/%d/fd' % pid))
+    except (IOError, OSError):
+        fds = 0
+    return {
+        'cpu': (int(fields[11]) + int(fields[12])) / float(_ticks),
+        'threads': int(fields[17]),
+        'rss': int(fields[21]) * _page_size,
+        'uss': uss,
+        'fds': fds,
+        'voluntary': voluntary,
+        'involuntary': involuntary
+    }
+
+
+def sample(pids, previous, elapsed):
+    '''
+    Returns the row for one sample and the counters to compare the
+    next one with. Rates are the change since previous, over elapsed
+    seconds. A process that was not in previous started during the
+    interval, so all of its counters count
+    '''
+    current = dict()
+    for pid in pids:
+        try:
+            current[pid] = usage(pid)
+        except (IOError, OSError, ValueError, IndexError):
+            # It exited while it was being read
+            continue
+
+    def rate(name):
+        total = 0
+        for pid, counters in current.iteritems():
+            total += counters[name] - previous.get(pid, {}).get(name, 0)
+        return max(0.0, total / elapsed) if elapsed > 0 else 0.0
+
+    rss = [counters['rss'] for counters in current.itervalues()]
+    row = {
+        'processes': len(current),
+        'threads': sum(counters['threads'] for counters in current.itervalues()),
+        'fds': sum(counters['fds'] for counters in current.itervalues()),
+        'rss': sum(rss),
+        'max rss': max(rss) if rss else 0,
+        'uss': sum(counters['uss'] for counters in current.itervalues()),
+        'cpu': rate('cpu') * 100.0,
+        'voluntary': rate('voluntary'),
+        'involuntary': rate('involuntary')
+    }
+    return (row, current)
+
+
+class ProcessSampler(threading.Thread):
+    '''
+    Writes a row to path every interval seconds until stop is called.
+    The processes are looked up again for every sample, so workers
+    that are restarted are followed
+    '''
+
+    def __init__(self, path, root_pid=None, port=None, interval=INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.path = path
+        self.root_pid = root_pid
+        self.port = port
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def run(self):
+        with open(self.path, 'w') as f:
+            writer = csv.writer(f)
+            # The same layout as dstat's output: a preamble, a blank
+            # line, the group row and the stat name row
+            writer.writerow(['TFB framework process usage'])
+            writer.writerow(['Root pid', self.root_pid, 'Port', self.port])
+            writer.writerow([])
+            writer.writerow(['system', GROUP] + [''] * (len(NAMES) - 1))
+            writer.writerow(['epoch'] + NAMES)
+
+            pids = proctree.framework(self.root_pid, self.port)
+            (_, previous) = sample(pids, {}, 0)
+            last = time.time()
+            while not self.stopped.wait(self.interval):
+                now = time.time()
+                pids = proctree.framework(self.root_pid, self.port)
+                (row, previous) = sample(pids, previous, now - last)
+                last = now
+                writer.writerow(["%.3f" % now] + [row[name] for name in NAMES])
+                f.flush()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
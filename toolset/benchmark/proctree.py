@@ -0,0 +1,147 @@
+'''
+Finds the processes a framework runs as, by reading /proc.
+
+Frameworks are started under TFBReaper (see FrameworkTest.start), so
+every process of a framework - setup.sh, the server, its workers - is
+a descendant of the reaper. The tree is read from the parent pid in
+/proc/<pid>/stat of every process, so processes that have exited
+since are simply missing.
+'''
+import os
+
+
+def _stat(pid):
+    '''
+    The fields of /proc/<pid>/stat after the command name, which is
+    in parentheses and may itself contain spaces and parentheses
+    '''
+    with open('/proc/%d/stat' % pid) as f:
+        data = f.read()
+    return data[data.rindex(')') + 2:].split()
+
+
+def pids():
+    return [int(name) for name in os.listdir('/proc') if name.isdigit()]
+
+
+def parent(pid):
+    return int(_stat(pid)[1])
+
+
+def children():
+    '''
+    Maps each pid to the pids of its children
+    '''
+    tree = dict()
+    for pid in pids():
+        try:
+            ppid = parent(pid)
+        except (IOError, OSError, ValueError, IndexError):
+            continue
+        tree.setdefault(ppid, []).append(pid)
+    return tree
+
+
+def descendants(pid):
+    '''
+    All the processes below pid, parents before their children
+    '''
+    tree = children()
+    found = []
+    pending = [pid]
+    while pending:
+        for child in sorted(tree.get(pending.pop(0), [])):
+            found.append(child)
+            pending.append(child)
+    return found
+
+
+def comm(pid):
+    '''
+    The name of a process, as ps shows it
+    '''
+    try:
+        with open('/proc/%d/comm' % pid) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def executable(pid):
+    try:
+        return os.readlink('/proc/%d/exe' % pid)
+    except (IOError, OSError):
+        return None
+
+
+def is_python(pid):
+    '''
+    True if the process runs CPython or PyPy. Servers like gunicorn
+    name their workers after themselves, so the executable is checked
+    rather than the name, and uwsgi embeds libpython
+    '''
+    exe = os.path.basename(executable(pid) or '')
+    if exe.startswith(('python', 'pypy')):
+        return True
+    try:
+        with open('/proc/%d/maps' % pid) as f:
+            return any('libpython' in line or 'libpypy' in line for line in f)
+    except (IOError, OSError):
+        return False
+
+
+def _listening_inodes(port):
+    '''
+    The inodes of the sockets listening on a TCP port
+    '''
+    inodes = set()
+    for table in ('/proc/net/tcp', '/proc/net/tcp6'):
+        try:
+            with open(table) as f:
+                next(f)
+                for line in f:
+                    fields = line.split()
+                    # local address is <ip>:<port> in hex, state 0A is LISTEN
+                    if int(fields[1].rsplit(':', 1)[1], 16) == int(port) and fields[3] == '0A':
+                        inodes.add(fields[9])
+        except (IOError, OSError):
+            continue
+    return inodes
+
+
+def listening(port):
+    '''
+    The processes holding a socket that listens on port. Only the
+    processes this user may inspect are found
+    '''
+    targets = set('socket:[%s]' % inode for inode in _listening_inodes(port))
+    found = []
+    if not targets:
+        return found
+    for pid in pids():
+        directory = '/proc/%d/fd' % pid
+        try:
+            for fd in os.listdir(directory):
+                if os.readlink(os.path.join(directory, fd)) in targets:
+                    found.append(pid)
+                    break
+        except (IOError, OSError):
+            continue
+    return found
+
+
+def framework(root_pid=None, port=None):
+    '''
+    The processes of a framework: everything under its TFBReaper,
+    plus whatever listens on its port and their children, for servers
+    that were not started from the reaper's tree
+    '''
+    found = []
+    if root_pid is not None:
+        found += descendants(root_pid)
+    if port is not None:
+        for pid in listening(port):
+            if pid not in found:
+                found.append(pid)
+                found += [child for child in descendants(pid) if child not in found]
+    return found
@@ -0,0 +1,227 @@
+'''
+Samples where a framework spends its CPU time while a test type is
+benchmarked (see --profile) and writes what it saw as collapsed stacks,
+one line per distinct stack:
+
+  <process>;<outermost frame>;...;<innermost frame> <samples>
+
+which flamegraph.pl and speedscope read directly.
+
+The processes profiled are those under the framework's TFBReaper when
+profiling starts (see proctree). Python processes are sampled with
+py-spy, which sees Python functions rather than the interpreter's C
+frames; all other processes are sampled together by one perf record,
+whose output is collapsed here. Attaching to another process needs
+root, so both run through sudo unless the toolset already is root. A
+profiler that is not installed is skipped with a message.
+'''
+import os
+import re
+import signal
+import subprocess
+import time
+from collections import Counter
+from distutils.spawn import find_executable
+
+from benchmark import proctree
+
+# Samples per second taken from each process. Not a multiple of the
+# usual timer frequencies, so sampling does not fall into step with
+# periodic work
+RATE = 99
+
+# Seconds a profiler is given to fail at startup, e.g. when
+# kernel.perf_event_paranoid does not allow perf to attach
+STARTUP = 0.5
+
+# Seconds a profiler is given to write its output once interrupted,
+# before it is terminated
+STOP_TIMEOUT = 30
+
+# Processes of the setup script rather than the framework
+SKIP = ('TFBReaper', 'bash', 'sh', 'sleep', 'tee', 'cat')
+
+_perf_header = re.compile(r"^(\S.*?)\s+[0-9]+(?:/[0-9]+)?\s")
+_perf_offset = re.compile(r"\+0x[0-9a-f]+$")
+
+
+def _perf_frame(line):
+    '''
+    The function of a perf script frame line, e.g.
+    "  7f3a1c2b4d5e PyEval_EvalFrameEx+0x1f3 (/usr/lib/libpython2.7.so)"
+    '''
+    parts = line.strip().split(None, 1)
+    if len(parts) < 2:
+        return '[unknown]'
+    (symbol, _, dso) = parts[1].rpartition(' (')
+    if not symbol:
+        (symbol, dso) = (dso, '')
+    symbol = _perf_offset.sub('', symbol)
+    if symbol == '[unknown]' and dso:
+        symbol = '[%s]' % os.path.basename(dso.rstrip(')'))
+    return symbol.replace(';', ':')
+
+
+def collapse_perf(lines):
+    '''
+    Collapses the output of `perf script` into a Counter of stacks.
+    Each sample is a header line naming the process, then its frames
+    innermost first, then a blank line
+    '''
+    stacks = Counter()
+    process = None
+    frames = []
+    for line in lines:
+        if not line.strip():
+            if process is not None:
+                stacks[';'.join([process] + frames[::-1])] += 1
+            (process, frames) = (None, [])
+        elif line[0] in ' \t':
+            if process is not None:
+                frames.append(_perf_frame(line))
+        elif not line.startswith('#'):
+            m = _perf_header.match(line)
+            process = (m.group(1) if m else line.split()[0]).replace(' ', '_')
+            frames = []
+    if process is not None:
+        stacks[';'.join([process] + frames[::-1])] += 1
+    return stacks
+
+
+def read_folded(path, process=None):
+    '''
+    Reads collapsed stacks, e.g. from py-spy --format raw, optionally
+    prefixing every stack with the process name
+    '''
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            (stack, _, count) = line.rstrip('\n').rpartition(' ')
+            if not stack or not count.isdigit():
+                continue
+            if process is not None:
+                stack = process + ';' + stack
+            stacks[stack] += int(count)
+    return stacks
+
+
+def _wait(p, timeout):
+    '''
+    Waits up to timeout seconds for p to exit. Returns whether it did
+    '''
+    deadline = time.time() + timeout
+    while p.poll() is None:
+        if time.time() > deadline:
+            return False
+        time.sleep(0.1)
+    return True
+
+
+def write_folded(path, stacks):
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.iteritems()):
+            f.write("%s %d\n" % (stack, count))
+
+
+class Profiler(object):
+    '''
+    Profiles the processes under root_pid from start until stop, which
+    writes their merged stacks to <directory>/profile.folded
+    '''
+
+    def __init__(self, root_pid, directory, out, rate=RATE):
+        self.root_pid = root_pid
+        self.directory = directory
+        self.out = out
+        self.rate = rate
+        self.sudo = [] if os.geteuid() == 0 else ['sudo']
+        # (process name, output file, Popen) of each running profiler
+        self.samplers = []
+        self.perf_data = os.path.join(directory, 'perf.data')
+
+    def start(self):
+        pids = [pid for pid in proctree.descendants(self.root_pid) if proctree.comm(pid) not in SKIP]
+        python = [pid for pid in pids if proctree.is_python(pid)]
+        native = [pid for pid in pids if pid not in python]
+        self.out.write("Profiling %d Python and %d other processes\n" % (len(python), len(native)))
+
+        if python and not find_executable('py-spy'):
+            self.out.write("py-spy is not installed, not profiling the Python processes\n")
+            python = []
+        for pid in python:
+            output = os.path.join(self.directory, 'profile.%d.txt' % pid)
+            p = subprocess.Popen(self.sudo + ['py-spy', 'record', '--pid', str(pid), '--rate', str(self.rate),
+                '--format', 'raw', '--nonblocking', '--output', output], stdout=self.out, stderr=self.out)
+            self.samplers.append((proctree.comm(pid), output, p))
+
+        if native and not find_executable('perf'):
+            self.out.write("perf is not installed, not profiling the other processes\n")
+            native = []
+        if native:
+            p = subprocess.Popen(self.sudo + ['perf', 'record', '-F', str(self.rate), '-g',
+                '-p', ','.join(str(pid) for pid in native), '-o', self.perf_data], stdout=self.out, stderr=self.out)
+            self.samplers.append((None, self.perf_data, p))
+
+        # A profiler that could not attach exits straight away, and
+        # would otherwise only show as an empty profile
+        time.sleep(STARTUP)
+        for sampler in list(self.samplers):
+            (_, output, p) = sampler
+            if p.poll() is not None:
+                if output == self.perf_data:
+                    self.out.write("perf record exited with %d at startup, see its output above. "
+                                   "kernel.perf_event_paranoid may not allow it\n" % p.returncode)
+                else:
+                    self.out.write("py-spy exited with %d at startup, see its output above\n" % p.returncode)
+                self.samplers.remove(sampler)
+
+    def stop(self):
+        '''
+        Stops the profilers, which write their output when interrupted,
+        and merges it. Returns the path of profile.folded, or None if
+        nothing was profiled
+        '''
+        for (_, _, p) in self.samplers:
+            self.__signal(p, signal.SIGINT)
+        for (_, _, p) in self.samplers:
+            if _wait(p, STOP_TIMEOUT):
+                continue
+            self.out.write("Profiler %d did not stop when interrupted, terminating it\n" % p.pid)
+            self.__signal(p, signal.SIGTERM)
+            if not _wait(p, 5):
+                self.__signal(p, signal.SIGKILL)
+                p.wait()
+
+        stacks = Counter()
+        for (process, output, _) in self.samplers:
+            if not os.path.exists(output):
+                continue
+            if output == self.perf_data:
+                script = subprocess.Popen(self.sudo + ['perf', 'script', '-i', output],
+                                          stdout=subprocess.PIPE, stderr=self.out)
+                stacks.update(collapse_perf(script.stdout))
+                script.wait()
+            else:
+                stacks.update(read_folded(output, process))
+            subprocess.call(self.sudo + ['rm', '-f', output])
+
+        if not stacks:
+            return None
+        path = os.path.join(self.directory, 'profile.folded')
+        write_folded(path, stacks)
+        return path
+
+    def __signal(self, p, signum):
+        '''
+        Sends signum to a profiler. Through sudo, p is sudo itself,
+        which does not relay a signal sent from its own process group
+        without a pty, so the profiler under it is signalled instead
+        '''
+        if p.poll() is not None:
+            return
+        if self.sudo:
+            subprocess.call(self.sudo + ['pkill', '-%d' % signum, '-P', str(p.pid)])
+            if signum == signal.SIGKILL:
+                subprocess.call(self.sudo + ['kill', '-%d' % signum, str(p.pid)])
+        else:
+            p.send_signal(signum)
@@ -0,0 +1,196 @@
+'''
+Compares the results.json of two runs and ranks the frameworks whose
+throughput or 99th percentile latency got worse between them.
+
+Levels are aligned by test type, framework and position, so both runs
+need to have used the same concurrency, query, stream and post levels. Each level
+gives a relative change per metric, and whether a change is a
+regression or just noise is judged against the spread of all the
+changes of that metric: most frameworks do not change between two
+runs, so the median absolute deviation (MAD) of the changes is a
+robust estimate of run-to-run noise. A change counts when it is
+larger than both a fixed floor and a multiple of the MAD.
+
+Levels run with --repetitions carry their own MAD (see aggregation),
+which replaces the guess above when it is larger: the change must
+then also exceed that many MADs of the two runs' repetitions.
+'''
+import math
+
+from benchmark.aggregation import mad
+
+# Changes smaller than this are always noise
+FLOOR = 0.05
+# How many (normal consistent) MADs a change must exceed
+MADS = 3.0
+# Scales a MAD to estimate a standard deviation for normal data
+MAD_SCALE = 1.4826
+
+# Each metric and whether a larger value is better
+METRICS = [('throughput', True), ('p99', False)]
+
+# The levels of the plaintext test are fixed, see FrameworkTest
+PIPELINE_LEVELS = [256, 1024, 4096, 16384]
+
+
+def _aggregate(level, name):
+    return (level.get('aggregate') or {}).get(name)
+
+
+def throughput(level):
+    '''
+    Requests per second of a level, falling back on totalRequests
+    over the level's duration for results parsed before
+    requestsPerSecond was recorded
+    '''
+    if _aggregate(level, 'requestsPerSecond') is not None:
+        return _aggregate(level, 'requestsPerSecond')['median']
+    if 'requestsPerSecond' in level:
+        return level['requestsPerSecond']
+    if 'totalRequests' in level and level.get('endTime', 0) > level.get('startTime', 0):
+        return level['totalRequests'] / float(level['endTime'] - level['startTime'])
+    return None
+
+
+def p99(level):
+    '''
+    99th percentile latency of a level in microseconds
+    '''
+    if _aggregate(level, 'latencyP99') is not None:
+        return _aggregate(level, 'latencyP99')['median']
+    return level.get('latency', {}).get('percentiles', {}).get('99')
+
+
+def repetition_noise(level_before, level_after, metric, value_before):
+    '''
+    The relative noise of a change measured from the repetitions of
+    both levels, or None if they were not repeated
+    '''
+    name = 'requestsPerSecond' if metric == 'throughput' else 'latencyP99'
+    (a, b) = (_aggregate(level_before, name), _aggregate(level_after, name))
+    if a is None or b is None or a['n'] < 2 or b['n'] < 2:
+        return None
+    return MAD_SCALE * math.sqrt(a['mad'] ** 2 + b['mad'] ** 2) / value_before
+
+
+def level_names(results, test_type):
+    if test_type in ('query', 'update'):
+        return results.get('queryIntervals')
+    if test_type == 'cached_query':
+        return results.get('cachedQueryIntervals')
+    if test_type == 'plaintext':
+        return PIPELINE_LEVELS
+    if test_type == 'stream':
+        return results.get('streamSizes')
+    if test_type == 'post':
+        return results.get('postItems')
+    return results.get('concurrencyLevels')
+
+
+def _changes(before, after):
+    '''
+    Returns one entry per level and metric present in both runs,
+    plus the (test type, framework) pairs only one of them has
+    '''
+    changes = []
+    missing = []
+    before_data = before.get('rawData', {})
+    after_data = after.get('rawData', {})
+    for test_type in sorted(set(before_data) | set(after_data)):
+        frameworks_before = before_data.get(test_type, {})
+        frameworks_after = after_data.get(test_type, {})
+        for framework in sorted(set(frameworks_before) | set(frameworks_after)):
+            if framework not in frameworks_before or framework not in frameworks_after:
+                missing.append({'type': test_type, 'framework': framework,
+                  'in': 'before' if framework in frameworks_before else 'after'})
+                continue
+            names = level_names(after, test_type) or []
+            levels = zip(frameworks_before[framework], frameworks_after[framework])
+            for index, (level_before, level_after) in enumerate(levels):
+                for metric, higher_is_better in METRICS:
+                    get = throughput if metric == 'throughput' else p99
+                    (a, b) = (get(level_before), get(level_after))
+                    if a is None or b is None or a <= 0:
+                        continue
+                    change = (b - a) / float(a)
+                    changes.append({
+                        'type': test_type,
+                        'framework': framework,
+                        'level': names[index] if index < len(names) else index,
+                        'metric': metric,
+                        'before': a,
+                        'after': b,
+                        'change': change,
+                        'noise': repetition_noise(level_before, level_after, metric, a),
+                        # Positive when the level got worse
+                        'regression': -change if higher_is_better else change
+                    })
+    return (changes, missing)
+
+
+def threshold(changes, floor=FLOOR, mads=MADS):
+    '''
+    The relative change above which a metric's changes are not noise
+    '''
+    spread = mad([c['change'] for c in changes])
+    if spread is None:
+        return floor
+    return max(floor, mads * MAD_SCALE * spread)
+
+
+def compare(before, after, floor=FLOOR, mads=MADS):
+    '''
+    Compares two loaded results.json files. Returns a report dict
+    with the regressions ranked worst first, the improvements ranked
+    best first, the threshold used for each metric and the test
+    types and frameworks that only one of the runs has
+    '''
+    (changes, missing) = _changes(before, after)
+    thresholds = dict()
+    regressions = []
+    improvements = []
+    unchanged = 0
+    for metric, _ in METRICS:
+        metric_changes = [c for c in changes if c['metric'] == metric]
+        thresholds[metric] = threshold(metric_changes, floor, mads)
+        for c in metric_changes:
+            limit = thresholds[metric]
+            if c['noise'] is not None:
+                limit = max(limit, mads * c['noise'])
+            if c['regression'] > limit:
+                regressions.append(c)
+            elif c['regression'] < -limit:
+                improvements.append(c)
+            else:
+                unchanged += 1
+    regressions.sort(key=lambda c: c['regression'], reverse=True)
+    improvements.sort(key=lambda c: c['regression'])
+    return {
+        'thresholds': thresholds,
+        'regressions': regressions,
+        'improvements': improvements,
+        'unchanged': unchanged,
+        'missing': missing
+    }
+
+
+def format_report(report):
+    '''
+    Formats a report made by compare for the console
+    '''
+    def rows(title, entries):
+        lines = ["%s (%d)" % (title, len(entries))]
+        for c in entries:
+            lines.append("  %+7.1f%%  %-10s %-12s %-40s level %-6s %.2f -> %.2f" % (
+                c['change'] * 100, c['metric'], c['type'], c['framework'],
+                c['level'], c['before'], c['after']))
+        return lines
+
+    lines = ["Noise thresholds: " + ", ".join("%s %.1f%%" % (metric, report['thresholds'][metric] * 100)
+                                              for metric, _ in METRICS)]
+    lines += rows("Regressions", report['regressions'])
+    lines += rows("Improvements", report['improvements'])
+    lines.append("Unchanged: %d" % report['unchanged'])
+    for m in report['missing']:
+        lines.append("Only %s: %s %s" % (m['in'], m['type'], m['framework']))
+    return "\n".join(lines)
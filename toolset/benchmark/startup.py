@@ -0,0 +1,129 @@
+'''
+Measures how quickly a framework starts (see --startup-runs). Once the
+benchmark of a framework is done it is restarted a few times, and each
+time the toolset records, from the moment TFBReaper was spawned:
+
+  portBound      - when a socket was listening on the framework's port
+  firstResponse  - when the URL of each test type first answered with
+                   a 200
+
+setup.sh runs again on every restart, so these include whatever it
+does before starting the server, such as checking that the
+requirements are installed.
+
+For Python frameworks with an import_module in benchmark_config.json,
+the time taken to import that module in a fresh interpreter is also
+measured. Interpreters that have -X importtime (3.7 and later) read
+PYTHONPROFILEIMPORTTIME from the environment and report every module
+they import; the slowest of those are kept.
+'''
+import re
+import threading
+import time
+
+from benchmark import proctree
+
+# Seconds between checks of the port and of the URLs. Checking the
+# port only reads /proc/net/tcp, so unlike binding it to see if it is
+# free, it cannot get in the way of the framework binding it
+INTERVAL = 0.01
+PROBE_INTERVAL = 0.05
+
+# Number of modules kept from -X importtime
+SLOWEST = 10
+
+_import_time = re.compile(r"^IMPORT_TIME ([0-9.]+)$", re.M)
+_import_line = re.compile(r"^import time:\s+([0-9]+) \|\s+([0-9]+) \| (\s*)(\S+)\s*$")
+
+
+def is_listening(port):
+    return len(proctree._listening_inodes(port)) > 0
+
+
+class PortWatcher(threading.Thread):
+    '''
+    Records the time at which something starts listening on port,
+    checking every interval seconds until then or until stop is called
+    '''
+
+    def __init__(self, port, interval=INTERVAL):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.port = port
+        self.interval = interval
+        self.bound_at = None
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.is_set():
+            if is_listening(self.port):
+                self.bound_at = time.time()
+                return
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def first_responses(test_types, base_url, since, timeout, interval=PROBE_INTERVAL):
+    '''
+    Probes the URL of each test type until it answers with a 200.
+    Returns a dict of the seconds from since until each one did, with
+    None for those that had not by timeout seconds after since
+    '''
+    answered = dict((name, None) for name in test_types)
+    while True:
+        for name, test_type in test_types.iteritems():
+            if answered[name] is None and test_type.probe(base_url):
+                answered[name] = time.time() - since
+        if all(seconds is not None for seconds in answered.values()):
+            return answered
+        if time.time() - since > timeout:
+            return answered
+        time.sleep(interval)
+
+
+def import_command(module):
+    '''
+    The Python code that imports module and prints how long that took.
+    It is valid Python 2 and 3. -X importtime writes to stderr, so the
+    start of the import is marked there too
+    '''
+    return ("import sys, time; sys.stderr.write('IMPORT_START\\n'); started = time.time(); "
+            "import %s; print('IMPORT_TIME %%f' %% (time.time() - started))" % module)
+
+
+def parse_import_time(output):
+    '''
+    The seconds printed by import_command, or None if the import failed
+    '''
+    m = _import_time.search(output)
+    return float(m.group(1)) if m else None
+
+
+def parse_importtime(output, slowest=SLOWEST):
+    '''
+    The modules that took the longest to import themselves, excluding
+    their own imports, from the output of -X importtime, e.g.
+
+      import time: self [us] | cumulative | imported package
+      import time:       478 |       8378 |   json.decoder
+
+    The indentation of the name is two spaces per level of nesting.
+    What the interpreter imported for itself before IMPORT_START is
+    left out
+    '''
+    modules = []
+    (_, _, output) = output.rpartition('IMPORT_START\n')
+    for line in output.splitlines():
+        m = _import_line.match(line)
+        if m:
+            modules.append({
+                'module': m.group(4),
+                'self': int(m.group(1)) / 1000000.0,
+                'cumulative': int(m.group(2)) / 1000000.0,
+                'depth': len(m.group(3)) // 2
+            })
+    modules.sort(key=lambda module: module['self'], reverse=True)
+    return modules[:slowest]
@@ -0,0 +1,455 @@
+'''
+Reads the resource usage files that dstat writes while a test is
+benchmarked (see FrameworkTest.__begin_logging).
+
+dstat's CSV output starts with a few lines of preamble ending in a
+blank line, followed by two header rows: the stat groups ("total cpu
+usage", "memory usage", "net/total", ...), which are only named above
+their first column, and the names of the stats within each group.
+Every row after that is one sample.
+
+The file is read once, keeping only the groups the toolset reports on,
+with every stat stored as a column of floats next to a shared column
+of sample times. Stats.window then cuts out the samples taken while a
+single concurrency or query level ran, without reading the file again,
+and summarize reduces those samples to a few numbers per level.
+
+The framework's own processes are sampled separately (see procstats)
+into a file that read also reads. merge adds those samples to the
+dstat ones, and summarize_processes reduces them like summarize.
+
+save and load keep the columns in a compact binary file, see save
+for the layout.
+'''
+import bisect
+import csv
+import itertools
+import json
+import math
+import struct
+import sys
+import zlib
+from array import array
+
+# Groups that are kept, matched by prefix. With dstat's -f option cpu,
+# net and dsk are reported per device, e.g. "cpu0 usage", "net/eth0".
+# "framework" is written by procstats
+GROUPS = ('total cpu usage', 'cpu', 'memory usage', 'net/', 'dsk/', 'io/', 'framework')
+
+
+def wanted(group):
+    return group.startswith(GROUPS)
+
+
+class Stats(object):
+    '''
+    Samples from a dstat file. epoch holds the sample times in
+    seconds and columns maps group -> stat name -> values, all of them
+    array('d') of the same length
+    '''
+
+    def __init__(self, epoch, columns, levels=None):
+        self.epoch = epoch
+        self.columns = columns
+        # (start, end) of each benchmark level, when known
+        self.levels = levels or []
+
+    def __len__(self):
+        return len(self.epoch)
+
+    def column(self, group, name):
+        return self.columns[group][name]
+
+    def window(self, start, end):
+        '''
+        Returns the samples taken between start and end inclusive
+        '''
+        lo = bisect.bisect_left(self.epoch, start)
+        hi = bisect.bisect_right(self.epoch, end)
+        columns = dict()
+        for group, stats in self.columns.iteritems():
+            columns[group] = dict((name, values[lo:hi]) for name, values in stats.iteritems())
+        return Stats(self.epoch[lo:hi], columns)
+
+    def level_windows(self):
+        '''
+        Returns the samples of each benchmark level, in order
+        '''
+        return [self.window(start, end) for (start, end) in self.levels]
+
+    def to_dict(self):
+        '''
+        Returns the samples as plain lists, ready to be dumped as JSON
+        '''
+        columns = dict()
+        for group, stats in self.columns.iteritems():
+            columns[group] = dict((name, values.tolist()) for name, values in stats.iteritems())
+        return {'epoch': self.epoch.tolist(), 'columns': columns}
+
+
+def _targets(groups, names, keep, columns):
+    '''
+    Maps the header rows to (index, column) pairs for the stats that
+    are kept. Returns the index of the epoch column and the pairs
+    '''
+    targets = []
+    group = ''
+    for i, name in enumerate(names):
+        if i < len(groups) and groups[i]:
+            group = groups[i]
+        if name == 'epoch' or not keep(group):
+            continue
+        column = columns.setdefault(group, dict()).setdefault(name, array('d'))
+        targets.append((i, column))
+    return (names.index('epoch'), targets)
+
+
+def read(path, keep=wanted):
+    '''
+    Reads a dstat CSV file in a single pass. keep is called with each
+    group name and decides whether its stats are read
+    '''
+    epoch = array('d')
+    columns = dict()
+    time_index = None
+    targets = []
+    header = None
+    with open(path) as f:
+        for row in csv.reader(f):
+            if not row:
+                # The end of the preamble, the header rows follow
+                header = []
+                continue
+            if header is not None:
+                header.append(row)
+                if len(header) == 2:
+                    (time_index, targets) = _targets(header[0], header[1], keep, columns)
+                    header = None
+                continue
+            if time_index is None:
+                continue
+            try:
+                time = float(row[time_index])
+                values = [float(row[i]) for i, _ in targets]
+            except (ValueError, IndexError):
+                # Truncated final row, or the preamble of a later run
+                continue
+            epoch.append(time)
+            for (_, column), value in zip(targets, values):
+                column.append(value)
+    return Stats(epoch, columns)
+
+
+def merge(stats, other):
+    '''
+    Adds the columns of other to stats, taking for each sample of stats
+    the sample of other nearest in time. Both sample once a second, so
+    this pairs samples at most half a second apart
+    '''
+    if len(other.epoch) == 0:
+        return stats
+    nearest = array('l')
+    for time in stats.epoch:
+        i = bisect.bisect_left(other.epoch, time)
+        if i == len(other.epoch) or (i > 0 and time - other.epoch[i - 1] <= other.epoch[i] - time):
+            i -= 1
+        nearest.append(i)
+    for group, columns in other.columns.iteritems():
+        target = stats.columns.setdefault(group, dict())
+        for name, values in columns.iteritems():
+            target[name] = array('d', (values[i] for i in nearest))
+    return stats
+
+
+###############################################################################
+# Summaries
+###############################################################################
+
+def _distribution(values):
+    '''
+    Returns the mean, 95th percentile and maximum of values, or None
+    if there are none
+    '''
+    if len(values) == 0:
+        return None
+    ordered = sorted(values)
+    # Nearest rank
+    rank = max(0, int(math.ceil(0.95 * len(ordered))) - 1)
+    return {
+        'mean': math.fsum(ordered) / len(ordered),
+        'p95': ordered[rank],
+        'max': ordered[-1]
+    }
+
+
+def _combine(columns, combine):
+    '''
+    Combines same length columns sample by sample
+    '''
+    if len(columns) == 1:
+        return columns[0]
+    return array('d', (combine(values) for values in itertools.izip(*columns)))
+
+
+def _groups(stats, prefix, total, exclude=()):
+    '''
+    Returns the group with the totals for a kind of device if dstat
+    reported one, otherwise the groups of the individual devices
+    '''
+    if total in stats.columns:
+        return [total]
+    return sorted(group for group in stats.columns
+                  if group.startswith(prefix) and group not in exclude)
+
+
+def _summarize_sum(stats, groups, name):
+    columns = [stats.columns[group][name] for group in groups if name in stats.columns[group]]
+    if not columns:
+        return None
+    return _distribution(_combine(columns, math.fsum))
+
+
+def summarize(stats):
+    '''
+    Summarizes the samples of one benchmark level as numbers:
+
+      cpu: percent of the cpu time that was not idle, averaged
+           across cores when dstat reported them one by one
+      memory: bytes of memory used
+      network: bytes per second received and sent, over every
+               interface but the loopback
+      disk: bytes per second read and written
+
+    each as a dict of mean, p95 and max. Stats that dstat did not
+    record are None
+    '''
+    summary = dict()
+
+    groups = _groups(stats, 'cpu', 'total cpu usage')
+    columns = [stats.columns[group]['idl'] for group in groups if 'idl' in stats.columns[group]]
+    summary['cpu'] = None
+    if columns:
+        idle = _combine(columns, lambda values: math.fsum(values) / len(values))
+        summary['cpu'] = _distribution(array('d', (100.0 - value for value in idle)))
+
+    summary['memory'] = None
+    if 'used' in stats.columns.get('memory usage', {}):
+        summary['memory'] = _distribution(stats.columns['memory usage']['used'])
+
+    groups = _groups(stats, 'net/', 'net/total', exclude=('net/lo',))
+    summary['network'] = {
+        'receive': _summarize_sum(stats, groups, 'recv'),
+        'send': _summarize_sum(stats, groups, 'send')
+    }
+
+    groups = _groups(stats, 'dsk/', 'dsk/total')
+    summary['disk'] = {
+        'read': _summarize_sum(stats, groups, 'read'),
+        'write': _summarize_sum(stats, groups, 'writ')
+    }
+    return summary
+
+
+def summarize_processes(stats):
+    '''
+    Summarizes the framework's own processes during one benchmark level
+    (see procstats), or returns None if they were not sampled:
+
+      processes, threads, fds: how many there were
+      memory: resident bytes of all of them
+      privateMemory: bytes private to each of them (USS), summed
+      memoryPerProcess: resident bytes per process
+      largestProcessMemory: resident bytes of the largest one
+      cpu: percent of one core used by all of them
+      contextSwitches: voluntary and involuntary, per second
+
+    each as a dict of mean, p95 and max
+    '''
+    columns = stats.columns.get('framework')
+    if not columns or len(stats.epoch) == 0:
+        return None
+    per_process = array('d', (rss / processes if processes > 0 else 0.0
+                              for rss, processes in itertools.izip(columns['rss'], columns['processes'])))
+    return {
+        'processes': _distribution(columns['processes']),
+        'threads': _distribution(columns['threads']),
+        'fds': _distribution(columns['fds']),
+        'memory': _distribution(columns['rss']),
+        # Not in files written before USS was sampled
+        'privateMemory': _distribution(columns['uss']) if 'uss' in columns else None,
+        'memoryPerProcess': _distribution(per_process),
+        'largestProcessMemory': _distribution(columns['max rss']),
+        'cpu': _distribution(columns['cpu']),
+        'contextSwitches': {
+            'voluntary': _distribution(columns['voluntary']),
+            'involuntary': _distribution(columns['involuntary'])
+        }
+    }
+
+
+def efficiency(requests_per_second, summary, processes=None):
+    '''
+    Returns requests per second per percent of cpu and per MB of
+    memory used, from a summary made by summarize. With a summary
+    made by summarize_processes, also per percent of one core and per
+    MB used by the framework itself
+    '''
+    result = {'requestsPerCpuPercent': None, 'requestsPerMB': None}
+    if processes is not None:
+        result.update({'requestsPerFrameworkCpuPercent': None, 'requestsPerFrameworkMB': None})
+    if requests_per_second is None:
+        return result
+    if summary['cpu'] is not None and summary['cpu']['mean'] > 0:
+        result['requestsPerCpuPercent'] = requests_per_second / summary['cpu']['mean']
+    if summary['memory'] is not None and summary['memory']['mean'] > 0:
+        result['requestsPerMB'] = requests_per_second / (summary['memory']['mean'] / (1024.0 * 1024.0))
+    if processes is not None:
+        if processes['cpu']['mean'] > 0:
+            result['requestsPerFrameworkCpuPercent'] = requests_per_second / processes['cpu']['mean']
+        if processes['memory']['mean'] > 0:
+            result['requestsPerFrameworkMB'] = requests_per_second / (processes['memory']['mean'] / (1024.0 * 1024.0))
+    return result
+
+
+###############################################################################
+# Columnar storage
+###############################################################################
+
+MAGIC = 'TFBSTATS'
+# Bumped if the layout written by save changes
+VERSION = 1
+
+RAW = 'raw'
+ZLIB_SHUFFLE = 'zlib-shuffle'
+
+
+def _shuffle(data):
+    # Groups the n-th byte of every float together. Neighbouring
+    # samples share their sign, exponent and high mantissa bytes,
+    # which zlib then compresses far better
+    return ''.join(data[i::8] for i in range(8))
+
+
+def _unshuffle(data):
+    count = len(data) // 8
+    out = bytearray(len(data))
+    for i in range(8):
+        out[i::8] = data[i * count:(i + 1) * count]
+    return str(out)
+
+
+def _encode(values, compress):
+    values = array('d', values)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    data = values.tostring()
+    if compress:
+        packed = zlib.compress(_shuffle(data), 6)
+        # Columns that do not compress are left as they are
+        if len(packed) < len(data):
+            return (ZLIB_SHUFFLE, packed)
+    return (RAW, data)
+
+
+def _decode(encoding, data):
+    if encoding == ZLIB_SHUFFLE:
+        data = _unshuffle(zlib.decompress(data))
+    elif encoding != RAW:
+        raise ValueError("Unknown stats column encoding %s" % encoding)
+    values = array('d')
+    values.fromstring(data)
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def _padding(size):
+    return '\0' * (-size % 8)
+
+
+def save(path, stats, compress=True):
+    '''
+    Writes stats to path as one block per column:
+
+      magic "TFBSTATS", version and index length as two
+      little endian uint32s, the JSON index, then the column blocks
+
+    The index holds the number of samples, the benchmark levels and,
+    for each column, its group, name, offset from the start of the
+    file, size in bytes and encoding. Columns are little endian
+    float64s, deflated after grouping their bytes by significance
+    ("zlib-shuffle") unless that does not make them smaller ("raw").
+    The sample times are the column ("epoch", "epoch").
+
+    Every block starts at a multiple of 8 bytes, so with compress
+    False the file can be memory mapped, e.g. with numpy.memmap.
+    '''
+    blocks = [('epoch', 'epoch') + _encode(stats.epoch, compress)]
+    for group in sorted(stats.columns):
+        for name in sorted(stats.columns[group]):
+            blocks.append((group, name) + _encode(stats.columns[group][name], compress))
+
+    index = {
+        'samples': len(stats.epoch),
+        'levels': [list(level) for level in stats.levels],
+        'columns': []
+    }
+    # The offsets depend on the size of the index that holds them, so
+    # lay the blocks out after a generous guess and grow it if needed
+    reserved = 256 + 160 * len(blocks)
+    while True:
+        offset = len(MAGIC) + 8 + reserved
+        offset += len(_padding(offset))
+        index['columns'] = []
+        for (group, name, encoding, data) in blocks:
+            index['columns'].append({'group': group, 'name': name,
+              'offset': offset, 'size': len(data), 'encoding': encoding})
+            offset += len(data) + len(_padding(len(data)))
+        header = json.dumps(index)
+        if len(header) <= reserved:
+            break
+        reserved = len(header)
+    header += ' ' * (reserved - len(header))
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', VERSION, len(header)))
+        f.write(header)
+        f.write(_padding(f.tell()))
+        for (group, name, encoding, data) in blocks:
+            f.write(data)
+            f.write(_padding(len(data)))
+
+
+def read_index(f):
+    '''
+    Reads the JSON index at the start of a file written by save
+    '''
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("Not a stats file")
+    (version, length) = struct.unpack('<II', f.read(8))
+    if version != VERSION:
+        raise ValueError("Unknown stats file version %s" % version)
+    return json.loads(f.read(length))
+
+
+def load(path, groups=None):
+    '''
+    Reads a file written by save back into a Stats. If groups is
+    given only the columns of those groups are read
+    '''
+    with open(path, 'rb') as f:
+        index = read_index(f)
+        epoch = None
+        columns = dict()
+        for column in index['columns']:
+            group = column['group']
+            if group != 'epoch' and groups is not None and group not in groups:
+                continue
+            f.seek(column['offset'])
+            values = _decode(column['encoding'], f.read(column['size']))
+            if group == 'epoch':
+                epoch = values
+            else:
+                columns.setdefault(group, dict())[column['name']] = values
+    return Stats(epoch, columns, [tuple(level) for level in index['levels']])
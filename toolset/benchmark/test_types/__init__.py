@@ -7,3 +7,6 @@ from query_type import QueryTestType
 from update_type import UpdateTestType
 from fortune_type import FortuneTestType
 from cached_query_type import CachedQueryTestType
+from churn_type import ChurnTestType
+from stream_type import StreamTestType
+from post_type import PostTestType
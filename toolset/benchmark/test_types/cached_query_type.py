@@ -20,6 +20,9 @@ class CachedQueryTestType(FrameworkTestType):
     def get_url(self):
         return self.cached_query_url
 
+    def get_probe_url(self):
+        return self.cached_query_url + '2'
+
     def verify(self, base_url):
         '''
         Validates the response is a JSON array of
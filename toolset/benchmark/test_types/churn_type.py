@@ -0,0 +1,112 @@
+from benchmark.test_types.framework_test_type import FrameworkTestType
+from benchmark.test_types.verifications import basic_body_verification
+
+import socket
+import time
+import urlparse
+
+
+class ChurnTestType(FrameworkTestType):
+
+    '''
+    Opens a new connection for every request. Each request is sent
+    with `Connection: close`, so the test measures how quickly a
+    framework accepts, serves and tears down short lived connections,
+    like those from a load balancer, rather than keep-alive throughput
+    '''
+
+    # Seconds to wait for the framework to close the connection
+    close_timeout = 5
+
+    def __init__(self):
+        kwargs = {
+            'name': 'churn',
+            'requires_db': False,
+            'accept_header': self.accept('plaintext'),
+            'args': ['churn_url']
+        }
+        FrameworkTestType.__init__(self, **kwargs)
+
+    def get_url(self):
+        return self.churn_url
+
+    def verify(self, base_url):
+        '''
+        Requests the URL over a fresh connection with
+        `Connection: close` and checks that the framework answers
+        with a non-empty 200 and then closes the connection itself
+        '''
+        url = base_url + self.churn_url
+        try:
+            status, headers, body, closed = self.request_and_close(url)
+        except (socket.error, ValueError, IndexError) as e:
+            return [('fail', "Request with Connection: close failed: %s" % e, url)]
+
+        if status != 200:
+            return [('fail', "Expected status 200, got %s" % status, url)]
+
+        _, problems = basic_body_verification(body, url, is_json_check=False)
+        if len(problems) > 0:
+            return problems
+
+        if not closed:
+            return [('fail',
+                     "The connection was still open %s seconds after the response to a request "
+                     "with Connection: close" % self.close_timeout, url)]
+
+        if headers.get('connection', '').lower() != 'close':
+            problems.append(
+                ('warn', 'Response to Connection: close should include "Connection: close"', url))
+
+        if len(problems) == 0:
+            return [('pass', '', url)]
+        else:
+            return problems
+
+    def request_and_close(self, url):
+        '''
+        Sends one GET with `Connection: close` over a new socket and
+        reads until the server closes it. Returns the status, the
+        headers (lower case names), the body and whether the server
+        closed the connection within close_timeout seconds
+        '''
+        print "Accessing URL %s with Connection: close:" % url
+        self.out.write("Accessing URL %s with Connection: close\n" % url)
+
+        parts = urlparse.urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        request = ("GET %s HTTP/1.1\r\nHost: %s\r\nAccept: %s\r\nConnection: close\r\n\r\n"
+                   % (path or '/', parts.netloc, self.accept_header))
+
+        sock = socket.create_connection((parts.hostname, parts.port or 80), timeout=15)
+        try:
+            sock.sendall(request)
+            sock.settimeout(self.close_timeout)
+            data = []
+            closed = False
+            deadline = time.time() + self.close_timeout
+            while time.time() < deadline:
+                try:
+                    chunk = sock.recv(65536)
+                except socket.timeout:
+                    break
+                if not chunk:
+                    closed = True
+                    break
+                data.append(chunk)
+        finally:
+            sock.close()
+
+        response = ''.join(data)
+        head, _, body = response.partition('\r\n\r\n')
+        lines = head.split('\r\n')
+        status = int(lines[0].split()[1])
+        headers = dict()
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        self.out.write(head + '\n\n' + body)
+        b = 40
+        print "  Response (trimmed to %d bytes): \"%s\"" % (b, body.strip()[:b])
+        return status, headers, body, closed
@@ -1,6 +1,8 @@
 import copy
+import os
 import sys
 import subprocess
+from multiprocessing.pool import ThreadPool
 from subprocess import PIPE
 import requests
 
@@ -11,6 +13,30 @@ logging.getLogger('urllib3').setLevel(logging.CRITICAL)
 
 from pprint import pprint
 
+# Connections kept open to the server, and so the most requests a test
+# type verifies at once
+POOL_SIZE = 8
+
+_session = None
+_session_pid = None
+
+
+def session():
+    '''
+    The requests.Session shared by all test types, so that verifying
+    reuses connections to the server instead of opening one for every
+    request. Tests run in parallel are separate processes, which each
+    need their own connections, so it is made again after a fork
+    '''
+    global _session, _session_pid
+    if _session is None or _session_pid != os.getpid():
+        _session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        _session.mount('http://', adapter)
+        _session.mount('https://', adapter)
+        _session_pid = os.getpid()
+    return _session
+
 
 class FrameworkTestType:
 
@@ -73,24 +99,59 @@ class FrameworkTestType:
             raise AttributeError(
                 "A %s requires the benchmark_config.json to contain %s" % (self.name, self.args))
 
-    def request_headers_and_body(self, url):
+    def request_headers_and_body(self, url, method='GET', data=None, content_type=None):
         '''
         Downloads a URL and returns the HTTP response headers
-        and body content as a tuple
+        and body content as a tuple. With data, the request
+        sends it as its body
         '''
-        print "Accessing URL %s:" % url
-        self.out.write("Accessing URL %s \n" % url)
+        headers, body = self.__fetch(url, method, data, content_type)
+        self.__log_response(url, headers, body)
+        return headers, body
 
+    def request_all(self, urls):
+        '''
+        Downloads several URLs at once over the shared session and
+        returns the (headers, body) of each, in the order of urls.
+        The responses are logged in that order once all of them
+        have arrived
+        '''
+        pool = ThreadPool(max(1, min(len(urls), POOL_SIZE)))
+        try:
+            responses = pool.map(self.__fetch, urls)
+        finally:
+            pool.close()
+        for url, (headers, body) in zip(urls, responses):
+            self.__log_response(url, headers, body)
+        return responses
+
+    def __fetch(self, url, method='GET', data=None, content_type=None):
         headers = {'Accept': self.accept_header}
-        r = requests.get(url, timeout=15, headers=headers)
+        if content_type is not None:
+            headers['Content-Type'] = content_type
+        r = session().request(method, url, timeout=15, headers=headers, data=data)
+        return r.headers, r.content
 
-        headers = r.headers
-        body = r.content
+    def __log_response(self, url, headers, body):
+        print "Accessing URL %s:" % url
+        self.out.write("Accessing URL %s \n" % url)
         self.out.write(str(headers))
         self.out.write(body)
         b = 40
         print "  Response (trimmed to %d bytes): \"%s\"" % (b, body.strip()[:b])
-        return headers, body
+
+    def probe(self, base_url):
+        '''
+        Returns True if the URL used by this test type currently
+        answers with a 200. Used to detect when a framework has
+        finished starting up, so it must be cheap and quiet
+        '''
+        headers = {'Accept': self.accept_header}
+        try:
+            r = session().get(base_url + self.get_probe_url(), timeout=5, headers=headers)
+        except requests.exceptions.RequestException:
+            return False
+        return r.status_code == 200
 
     def verify(self, base_url):
         '''
@@ -119,6 +180,13 @@ class FrameworkTestType:
         # for their URL so the base class can't know which arg is the URL
         raise NotImplementedError("Subclasses must provide get_url")
 
+    def get_probe_url(self):
+        '''
+        Returns the URL polled by probe. Test types whose URL
+        expects a parameter to be appended override this
+        '''
+        return self.get_url()
+
     def copy(self):
         '''
         Returns a copy that can be safely modified.
@@ -0,0 +1,94 @@
+from benchmark.test_types.framework_test_type import FrameworkTestType, session
+from benchmark.test_types.verifications import (
+    basic_body_verification,
+    verify_headers
+)
+
+import hashlib
+import requests
+
+
+def make_body(items):
+    '''
+    The JSON body with the given number of items. ~/post.lua on the
+    client builds exactly the same bytes, see client.sh
+    '''
+    return '{"items":[' + ','.join(
+        '{"id":%d,"name":"item %d","score":%d.5,"tags":["alpha","beta"]}' % (i, i, i % 100)
+        for i in xrange(1, items + 1)) + ']}'
+
+
+class PostTestType(FrameworkTestType):
+
+    '''
+    JSON ingestion. Each request POSTs a JSON object whose `items`
+    array holds a number of small objects, and the framework parses
+    it and answers with the number of items and the SHA-256 of the
+    body it received, e.g. {"count": 10, "digest": "9f86d0..."}
+    '''
+
+    # Item counts checked by verify
+    verify_items = [1, 100]
+
+    def __init__(self):
+        kwargs = {
+            'name': 'post',
+            'requires_db': False,
+            'accept_header': self.accept('json'),
+            'args': ['post_url']
+        }
+        FrameworkTestType.__init__(self, **kwargs)
+
+    def get_url(self):
+        return self.post_url
+
+    def probe(self, base_url):
+        '''
+        The URL only answers POSTs, so the probe sends one
+        '''
+        headers = {'Accept': self.accept_header, 'Content-Type': 'application/json'}
+        try:
+            r = session().post(base_url + self.post_url, data=make_body(1), timeout=5, headers=headers)
+        except requests.exceptions.RequestException:
+            return False
+        return r.status_code == 200
+
+    def verify(self, base_url):
+        '''
+        POSTs bodies of a few sizes and checks that the response
+        is a JSON object with the right `count` and `digest`
+        '''
+        url = base_url + self.post_url
+        problems = []
+        for items in self.verify_items:
+            body = make_body(items)
+            headers, response = self.request_headers_and_body(
+                url, method='POST', data=body, content_type='application/json')
+
+            response, body_problems = basic_body_verification(response, url)
+            if len(body_problems) > 0:
+                problems += body_problems
+                continue
+
+            if not isinstance(response, dict):
+                problems.append(('fail', "Expected a JSON object, got '%s'" % response, url))
+                continue
+            response = dict((k.lower(), v) for k, v in response.iteritems())
+
+            try:
+                count = int(response.get('count'))
+            except (TypeError, ValueError):
+                count = None
+            if count != items:
+                problems.append(('fail', "Posted %d items, got count %s" % (items, response.get('count')), url))
+            digest = hashlib.sha256(body).hexdigest()
+            if str(response.get('digest', '')).lower() != digest:
+                problems.append(('fail', "Expected digest %s for %d items, got %s"
+                                 % (digest, items, response.get('digest')), url))
+
+            problems += verify_headers(headers, url, should_be='json')
+
+        if len(problems) == 0:
+            return [('pass', '', url)]
+        else:
+            return problems
@@ -22,6 +22,9 @@ class QueryTestType(FrameworkTestType):
     def get_url(self):
         return self.query_url
 
+    def get_probe_url(self):
+        return self.query_url + '2'
+
     def verify(self, base_url):
         '''
         Validates the response is a JSON array of 
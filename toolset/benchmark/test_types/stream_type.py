@@ -0,0 +1,94 @@
+from benchmark.test_types.framework_test_type import FrameworkTestType, session
+from benchmark.test_types.verifications import verify_headers
+
+import hashlib
+import requests
+
+
+class StreamTestType(FrameworkTestType):
+
+    '''
+    Large responses. The size in bytes is appended to the URL and the
+    framework answers with that many bytes of the pattern
+    "0123456789abcdef" repeated, however it prefers to write them:
+    in one piece, as an iterable of chunks or streamed. The benchmark
+    runs at each of --stream-levels and reports megabytes per second
+    '''
+
+    pattern = "0123456789abcdef"
+
+    # Sizes checked by verify. 100000 is not a multiple of the usual
+    # chunk sizes, so the last chunk must be cut short correctly
+    verify_sizes = [65536, 100000, 1048576]
+
+    def __init__(self):
+        kwargs = {
+            'name': 'stream',
+            'requires_db': False,
+            'accept_header': self.accept('plaintext'),
+            'args': ['stream_url']
+        }
+        FrameworkTestType.__init__(self, **kwargs)
+
+    def get_url(self):
+        return self.stream_url
+
+    def get_probe_url(self):
+        return self.stream_url + '1024'
+
+    def verify(self, base_url):
+        '''
+        Requests a few sizes and checks that each response has
+        exactly that many bytes and the expected SHA-256
+        '''
+        problems = []
+        for size in self.verify_sizes:
+            url = base_url + self.stream_url + str(size)
+            try:
+                headers, length, digest = self.request_digest(url)
+            except requests.exceptions.RequestException as e:
+                problems.append(('fail', "Request failed: %s" % e, url))
+                continue
+
+            if length != size:
+                problems.append(('fail', "Expected %d bytes, got %d" % (size, length), url))
+                continue
+            if digest != self.expected_digest(size):
+                problems.append(('fail', "The body is not the pattern %s repeated" % self.pattern, url))
+                continue
+
+            problems += verify_headers(headers, url, should_be='plaintext')
+
+        if len(problems) == 0:
+            return [('pass', '', base_url + self.stream_url + str(size)) for size in self.verify_sizes]
+        else:
+            return problems
+
+    def request_digest(self, url):
+        '''
+        Downloads a URL without keeping the body in memory or in the
+        log. Returns the headers, the body length and its SHA-256
+        '''
+        print "Accessing URL %s:" % url
+        self.out.write("Accessing URL %s \n" % url)
+
+        r = session().get(url, timeout=60, headers={'Accept': self.accept_header}, stream=True)
+        sha = hashlib.sha256()
+        length = 0
+        for chunk in r.iter_content(65536):
+            sha.update(chunk)
+            length += len(chunk)
+
+        self.out.write(str(r.headers))
+        self.out.write("\n%d bytes, sha256 %s\n" % (length, sha.hexdigest()))
+        print "  Response: %d bytes" % length
+        return r.headers, length, sha.hexdigest()
+
+    def expected_digest(self, size):
+        full, rest = divmod(size, len(self.pattern))
+        sha = hashlib.sha256()
+        block = self.pattern * 4096
+        for _ in xrange(full // 4096):
+            sha.update(block)
+        sha.update(self.pattern * (full % 4096) + self.pattern[:rest])
+        return sha.hexdigest()
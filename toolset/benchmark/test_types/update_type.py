@@ -16,6 +16,9 @@ class UpdateTestType(FrameworkTestType):
     def get_url(self):
         return self.update_url
 
+    def get_probe_url(self):
+        return self.update_url + '2'
+
     def verify(self, base_url):
         '''Validates the response is a JSON array of 
         the proper length, each JSON Object in the array 
@@ -277,9 +277,11 @@ def verify_query_cases(self, cases, url):
     MAX = 500
     MIN = 1
 
-    for q, max_infraction in cases:
+    # The cases are independent, so they are all requested at once
+    responses = self.request_all([url + q for q, _ in cases])
+
+    for (q, max_infraction), (headers, body) in zip(cases, responses):
         case_url = url + q
-        headers, body = self.request_headers_and_body(case_url)
 
         try:
             queries = int(q)  # drops down for 'foo' and ''
@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+'''
+A small HTTP/1.1 load generator written with asyncio, used in place
+of wrk when the toolset runs with --load-generator asyncio.
+
+It accepts the subset of wrk's command line used by the toolset's
+benchmark scripts (see FrameworkTest in toolset/benchmark) and
+prints its results in wrk's format, followed by the lines that
+~/latency.lua adds, so that the same parser handles both:
+
+  aiowrk.py -H 'Accept: */*' --latency -d 15 -c 256 -t 8 --timeout 8 \
+      http://TFB-server:8080/plaintext -s ~/pipeline.lua -- 16
+
+Each of the -t threads is a separate process running its own event
+loop with its share of the -c connections. Connections are kept
+alive, and with pipeline.lua several requests are written at once.
+With post.lua every request is a POST of the JSON body that script
+builds.
+
+With -R, like wrk2, requests are sent at a constant total rate
+instead of as fast as responses arrive. Each request has a scheduled
+send time and its latency is measured from that time, so a stalled
+server is charged for the requests it held up (coordinated omission).
+Requires Python 3.6 or newer; uses uvloop if it is installed.
+'''
+import argparse
+import asyncio
+import collections
+import math
+import multiprocessing
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+PERCENTILES = (50, 75, 90, 99, 99.9, 99.99)
+
+
+###############################################################################
+# Command line
+###############################################################################
+
+def parse_duration(text):
+    '''Parses a wrk duration such as "15", "15s", "2m" into seconds'''
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def parse_args(argv):
+    # wrk passes everything after "--" on to its script
+    if '--' in argv:
+        index = argv.index('--')
+        argv, script_args = argv[:index], argv[index + 1:]
+    else:
+        script_args = []
+
+    parser = argparse.ArgumentParser(description='asyncio HTTP/1.1 load generator with a wrk compatible interface')
+    parser.add_argument('url')
+    parser.add_argument('-c', '--connections', type=int, default=10)
+    parser.add_argument('-d', '--duration', type=parse_duration, default=10.0)
+    parser.add_argument('-t', '--threads', type=int, default=2)
+    parser.add_argument('-H', '--header', action='append', default=[], dest='headers')
+    parser.add_argument('-s', '--script', default=None)
+    parser.add_argument('--timeout', type=parse_duration, default=2.0)
+    parser.add_argument('--latency', action='store_true', default=False)
+    parser.add_argument('-R', '--rate', type=float, default=None)
+    args = parser.parse_args(argv)
+
+    # The toolset's wrk scripts are recognised by name
+    args.pipeline = 1
+    args.body = None
+    script = os.path.basename(args.script) if args.script is not None else None
+    if script == 'pipeline.lua':
+        args.pipeline = int(script_args[0]) if script_args else 1
+    elif script == 'post.lua':
+        args.body = post_body(int(script_args[0]) if script_args else 1)
+
+    # Requests are scheduled one at a time at a constant rate
+    if args.rate is not None:
+        args.pipeline = 1
+
+    args.threads = max(1, min(args.threads, args.connections))
+    return args
+
+
+def post_body(items):
+    '''The JSON body that ~/post.lua sends, see client.sh'''
+    return ('{"items":[' + ','.join(
+        '{"id":%d,"name":"item %d","score":%d.5,"tags":["alpha","beta"]}' % (i, i, i % 100)
+        for i in range(1, items + 1)) + ']}').encode('latin-1')
+
+
+def build_request(url, headers, body=None):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    names = set(h.split(':', 1)[0].strip().lower() for h in headers)
+    lines = ['%s %s HTTP/1.1' % ('GET' if body is None else 'POST', path)]
+    if 'host' not in names:
+        lines.append('Host: %s' % parts.netloc)
+    lines.extend(headers)
+    if body is not None:
+        lines.append('Content-Type: application/json')
+        lines.append('Content-Length: %d' % len(body))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b'')
+
+
+###############################################################################
+# Worker process
+###############################################################################
+
+class Stats:
+    def __init__(self):
+        self.latency = collections.Counter()  # microseconds -> count
+        self.requests = 0
+        self.bytes = 0
+        self.non2xx = 0
+        self.errors = {'connect': 0, 'read': 0, 'write': 0, 'timeout': 0}
+        self.per_second = collections.Counter()  # second of the run -> requests
+
+
+async def read_response(reader):
+    '''
+    Reads one response. Returns (status, bytes read, keep alive)
+    '''
+    head = await reader.readuntil(b'\r\n\r\n')
+    size = len(head)
+    lines = head.split(b'\r\n')
+    status = int(lines[0].split(None, 2)[1])
+    length = None
+    chunked = False
+    keep_alive = not lines[0].startswith(b'HTTP/1.0')
+    for line in lines[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        value = value.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding' and b'chunked' in value:
+            chunked = True
+        elif name == b'connection':
+            keep_alive = value != b'close'
+
+    if chunked:
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            size += len(line)
+            chunk = int(line.split(b';', 1)[0], 16)
+            size += await discard(reader, chunk + 2)
+            if chunk == 0:
+                break
+    elif length is not None:
+        size += await discard(reader, length)
+    elif status >= 200 and status not in (204, 304):
+        # No framing, the body runs until the connection is closed
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            size += len(data)
+        keep_alive = False
+    return status, size, keep_alive
+
+
+async def discard(reader, count):
+    remaining = count
+    while remaining > 0:
+        data = await reader.read(min(remaining, 1048576))
+        if not data:
+            raise asyncio.IncompleteReadError(b'', remaining)
+        remaining -= len(data)
+    return count
+
+
+async def connection(args, host, port, request, deadline, started, stats, interval=None, offset=0.0):
+    '''
+    Sends requests over one connection until the deadline. With an
+    interval, the n-th request is due at started + offset + n *
+    interval and its latency is measured from then
+    '''
+    batch = request * args.pipeline
+    reader = writer = None
+    due = started + offset
+    await asyncio.sleep(max(0, started - time.perf_counter()))
+    while time.perf_counter() < deadline:
+        if interval is not None:
+            await asyncio.sleep(max(0, due - time.perf_counter()))
+            if due >= deadline:
+                break
+        if writer is None:
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(host, port), args.timeout)
+            except asyncio.TimeoutError:
+                stats.errors['timeout'] += 1
+                continue
+            except OSError:
+                stats.errors['connect'] += 1
+                await asyncio.sleep(0.01)
+                continue
+
+        begin = time.perf_counter()
+        if interval is not None:
+            begin = due
+            due += interval
+        try:
+            writer.write(batch)
+            await writer.drain()
+        except OSError:
+            stats.errors['write'] += 1
+            writer.close()
+            writer = None
+            continue
+
+        keep_alive = True
+        try:
+            for _ in range(args.pipeline):
+                status, size, keep_alive = await asyncio.wait_for(read_response(reader), args.timeout)
+                now = time.perf_counter()
+                stats.latency[int((now - begin) * 1000000)] += 1
+                stats.requests += 1
+                stats.bytes += size
+                stats.per_second[int(now - started)] += 1
+                if status < 200 or status > 399:
+                    stats.non2xx += 1
+                if not keep_alive:
+                    break
+        except asyncio.TimeoutError:
+            stats.errors['timeout'] += 1
+            keep_alive = False
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            stats.errors['read'] += 1
+            keep_alive = False
+
+        if not keep_alive:
+            writer.close()
+            writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+def run_worker(args, connections, first, started, deadline):
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+
+    parts = urlsplit(args.url)
+    host = parts.hostname
+    port = parts.port or 80
+    request = build_request(args.url, args.headers, args.body)
+    stats = Stats()
+
+    # Worker processes start at slightly different times, so each
+    # converts the shared start time into its own clock
+    offset = time.perf_counter() - time.time()
+    # With a rate, every connection sends its share of the requests
+    # and the connections take turns so the requests are evenly spaced
+    interval = None
+    if args.rate is not None:
+        interval = args.connections / args.rate
+    tasks = [connection(args, host, port, request, deadline + offset, started + offset, stats,
+                        interval, (first + i) / args.rate if interval else 0.0)
+             for i in range(connections)]
+    loop.run_until_complete(asyncio.gather(*tasks))
+    loop.close()
+    return stats
+
+
+###############################################################################
+# Report
+###############################################################################
+
+def format_time(us):
+    if us < 1000:
+        return '%.2fus' % us
+    if us < 1000000:
+        return '%.2fms' % (us / 1000.0)
+    return '%.2fs' % (us / 1000000.0)
+
+
+def format_count(n):
+    for unit, scale in (('M', 1000000.0), ('k', 1000.0)):
+        if n >= scale:
+            return '%.2f%s' % (n / scale, unit)
+    return '%.2f' % n
+
+
+def format_bytes(n):
+    for unit, scale in (('GB', 1 << 30), ('MB', 1 << 20), ('KB', 1 << 10)):
+        if n >= scale:
+            return '%.2f%s' % (n / float(scale), unit)
+    return '%.2fB' % n
+
+
+def summarize(values):
+    '''
+    values is a Counter of value -> count. Returns (mean, stdev, max,
+    percent of samples within one stdev of the mean)
+    '''
+    total = sum(values.values())
+    if total == 0:
+        return 0.0, 0.0, 0.0, 0.0
+    mean = sum(v * c for v, c in values.items()) / float(total)
+    variance = sum(c * (v - mean) ** 2 for v, c in values.items()) / float(total)
+    stdev = math.sqrt(variance)
+    within = sum(c for v, c in values.items() if abs(v - mean) <= stdev)
+    return mean, stdev, max(values), 100.0 * within / total
+
+
+def percentile(values, p):
+    total = sum(values.values())
+    wanted = total * p / 100.0
+    seen = 0
+    for value in sorted(values):
+        seen += values[value]
+        if seen >= wanted:
+            return value
+    return 0
+
+
+def bucket(value):
+    '''Rounds down to three significant digits, as latency.lua does'''
+    unit = 1
+    while value >= 1000 * unit:
+        unit *= 10
+    return (value // unit) * unit
+
+
+def report(args, stats, elapsed):
+    latency = collections.Counter()
+    per_second = collections.Counter()
+    for s in stats:
+        latency.update(s.latency)
+        # Requests per second of each worker, like wrk's per thread Req/Sec
+        for second, count in s.per_second.items():
+            per_second[count] += 1
+    requests = sum(s.requests for s in stats)
+    transferred = sum(s.bytes for s in stats)
+    non2xx = sum(s.non2xx for s in stats)
+    errors = dict((k, sum(s.errors[k] for s in stats)) for k in ('connect', 'read', 'write', 'timeout'))
+
+    out = sys.stdout
+    out.write('Running %s test @ %s\n' % (format_time(args.duration * 1000000).replace('.00', ''), args.url))
+    out.write('  %d threads and %d connections\n' % (args.threads, args.connections))
+    out.write('  Thread Stats   Avg      Stdev     Max   +/- Stdev\n')
+    mean, stdev, maximum, within = summarize(latency)
+    out.write('    Latency %10s %10s %10s %8.2f%%\n' % (format_time(mean), format_time(stdev), format_time(maximum), within))
+    mean, stdev, maximum, within = summarize(per_second)
+    out.write('    Req/Sec %10s %10s %10s %8.2f%%\n' % (format_count(mean), format_count(stdev), format_count(maximum), within))
+    if args.latency:
+        out.write('  Latency Distribution\n')
+        for p in (50, 75, 90, 99):
+            out.write('  %3d%% %10s\n' % (p, format_time(percentile(latency, p))))
+    out.write('  %d requests in %s, %s read\n' % (requests, format_time(elapsed * 1000000), format_bytes(transferred)))
+    if any(errors.values()):
+        out.write('  Socket errors: connect %(connect)d, read %(read)d, write %(write)d, timeout %(timeout)d\n' % errors)
+    if non2xx:
+        out.write('  Non-2xx or 3xx responses: %d\n' % non2xx)
+    out.write('Requests/sec: %12.2f\n' % (requests / elapsed))
+    out.write('Transfer/sec: %10s\n' % format_bytes(transferred / elapsed))
+
+    # The same lines as ~/latency.lua
+    if latency:
+        mean, stdev, maximum, _ = summarize(latency)
+        out.write('LATENCY_STATS %d %d %.2f %.2f\n' % (min(latency), maximum, mean, stdev))
+        for p in PERCENTILES:
+            out.write('LATENCY_PERCENTILE %g %d\n' % (p, percentile(latency, p)))
+        buckets = collections.Counter()
+        for value, count in latency.items():
+            buckets[bucket(value)] += count
+        out.write('LATENCY_HISTOGRAM %s\n' % ' '.join('%d:%d' % (v, buckets[v]) for v in sorted(buckets)))
+    out.flush()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+
+    # Spread the connections over the workers as evenly as possible
+    shares = [args.connections // args.threads] * args.threads
+    for i in range(args.connections % args.threads):
+        shares[i] += 1
+
+    started = time.time() + 0.5  # Give every worker time to start
+    deadline = started + args.duration
+    firsts = [sum(shares[:i]) for i in range(len(shares))]
+    with multiprocessing.Pool(args.threads) as pool:
+        results = pool.starmap(run_worker, [(args, share, first, started, deadline)
+                                            for share, first in zip(shares, firsts)])
+    report(args, results, time.time() - started)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -144,19 +144,30 @@ def main(argv=None):
     parser.add_argument('--test', nargs='+', help='names of tests to run')
     parser.add_argument('--test-dir', nargs='+', dest='test_dir', help='name of framework directory containing all tests to run')
     parser.add_argument('--exclude', nargs='+', help='names of tests to exclude')
-    parser.add_argument('--type', choices=['all', 'json', 'db', 'query', 'cached_query', 'fortune', 'update', 'plaintext'], default='all', help='which type of test to run')
+    parser.add_argument('--type', choices=['all', 'json', 'db', 'query', 'cached_query', 'fortune', 'update', 'plaintext', 'churn', 'stream', 'post'], default='all', help='which type of test to run')
     parser.add_argument('-m', '--mode', choices=['benchmark', 'verify', 'debug'], default='benchmark', help='verify mode will only start up the tests, curl the urls and shutdown. debug mode will skip verification and leave the server running.')
     parser.add_argument('--list-tests', action='store_true', default=False, help='lists all the known tests that can run')
 
     # Benchmark options
     parser.add_argument('--duration', default=15, help='Time in seconds that each test should run for.')
-    parser.add_argument('--sleep', type=int, default=60, help='the amount of time to sleep after starting each test to allow the server to start up.')
+    parser.add_argument('--warmup-cv', type=float, default=0.05, dest='warmup_cv', help='The warmup ends once the coefficient of variation of the throughput of its last few windows is at most this.')
+    parser.add_argument('--warmup-max', type=int, default=120, dest='warmup_max', help='The longest time in seconds the warmup may run for, if the throughput never settles.')
+    parser.add_argument('--open-loop', action='store_true', default=False, dest='open_loop', help='After each benchmark, also sends requests at fixed rates with wrk2 and records latency corrected for coordinated omission at each rate.')
+    parser.add_argument('--rate-levels', nargs='+', type=int, default=[10, 25, 50, 75, 90, 100, 110, 120], dest='rate_levels', help='The open loop request rates, in percent of the highest requests/sec of the benchmark.')
+    parser.add_argument('--stream-levels', nargs='+', type=int, default=[65536, 1048576, 16777216, 67108864], dest='stream_levels', help='The response sizes in bytes that the stream test type is benchmarked at.')
+    parser.add_argument('--post-levels', nargs='+', type=int, default=[1, 10, 100, 1000], dest='post_levels', help='The numbers of items in the JSON bodies that the post test type is benchmarked with.')
+    parser.add_argument('--profile', action='store_true', default=False, help='Samples the framework\'s processes with py-spy, or perf for non-Python processes, while each test type is benchmarked and writes collapsed stacks (for flame graphs) to profile.folded beside raw.txt.')
+    parser.add_argument('--startup-runs', type=int, default=0, dest='startup_runs', help='After benchmarking each test, restarts it this many times and records how long it took to bind its port and to first answer each URL, and how long its import_module took to import.')
+    parser.add_argument('--repetitions', type=int, default=1, help='Number of times each concurrency or query level is run. With more than one, results.json gets the median, MAD and a bootstrap confidence interval of each level.')
+    parser.add_argument('--load-generator', choices=['wrk', 'asyncio'], default='wrk', dest='load_generator', help='wrk runs on the client machine over ssh. asyncio runs toolset/loadgen/aiowrk.py on this machine and needs Python 3.6.')
+    parser.add_argument('--sleep', type=int, default=60, help='the maximum amount of time to wait after starting each test for its URLs to respond.')
 
     # Misc Options
     parser.add_argument('--results-name', help='Gives a name to this set of results, formatted as a date', default='(unspecified, datetime = %Y-%m-%d %H:%M:%S)')
     parser.add_argument('--results-environment', help='Describes the environment in which these results were gathered', default='(unspecified, hostname = %s)' % socket.gethostname())
     parser.add_argument('--results-upload-uri', default=None, help='A URI where the in-progress results.json file will be POSTed periodically')
     parser.add_argument('--parse', help='Parses the results of the given timestamp and merges that with the latest results')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compares the results of two timestamps and reports throughput and latency regressions')
     parser.add_argument('-v', '--verbose', action='store_true', default=False, help='Causes the configuration to print before any other commands are executed.')
     parser.add_argument('--quiet', action='store_true', default=False, help='Only print a limited set of messages to stdout, keep the bulk of messages in log files only')
     parser.add_argument('--clear-tmp', action='store_true', default=False, help='Clears files written to /tmp after each framework\'s tests complete.')
@@ -172,6 +183,8 @@ def main(argv=None):
         benchmarker.run_list_tests()
     elif args.parse != None:
         benchmarker.parse_timestamp()
+    elif args.compare != None:
+        return benchmarker.compare_timestamps()
     else:
         return benchmarker.run()
 
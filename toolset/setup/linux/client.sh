@@ -29,6 +29,56 @@ make
 sudo cp wrk /usr/local/bin
 cd ~
 
+##############################
+# wrk2
+##############################
+# Sends requests at a constant rate (-R) for --open-loop and
+# corrects its latency figures for coordinated omission. Installed
+# as wrk2 alongside wrk.
+rm -rf wrk2
+git clone https://github.com/giltene/wrk2.git
+cd wrk2
+make
+sudo cp wrk /usr/local/bin/wrk2
+cd ~
+
+#############################
+# latency.lua
+#############################
+# Prints exact latency figures in microseconds for the toolset to
+# parse, see toolset/benchmark/latency.py. The histogram is bucketed
+# to three significant digits, like HdrHistogram, to keep it short.
+rm -rf latency.lua
+cat << 'EOF' | tee latency.lua
+done = function(summary, latency, requests)
+  io.write(string.format("LATENCY_STATS %d %d %.2f %.2f\n",
+    latency.min, latency.max, latency.mean, latency.stdev))
+  for _, p in ipairs({50, 75, 90, 99, 99.9, 99.99}) do
+    io.write(string.format("LATENCY_PERCENTILE %g %d\n", p, latency:percentile(p)))
+  end
+  local buckets = {}
+  for i = 1, #latency do
+    local value, count = latency(i)
+    local unit = 1
+    while value >= 1000 * unit do
+      unit = unit * 10
+    end
+    value = math.floor(value / unit) * unit
+    buckets[value] = (buckets[value] or 0) + count
+  end
+  local values = {}
+  for value in pairs(buckets) do
+    table.insert(values, value)
+  end
+  table.sort(values)
+  local histogram = {}
+  for i, value in ipairs(values) do
+    histogram[i] = string.format("%d:%d", value, buckets[value])
+  end
+  io.write("LATENCY_HISTOGRAM " .. table.concat(histogram, " ") .. "\n")
+end
+EOF
+
 #############################
 # pipeline.lua
 #############################
@@ -47,3 +97,26 @@ request = function()
   return req
 end
 EOF
+
+# wrk only loads one script, so the pipelined runs report latency too
+cat latency.lua >> pipeline.lua
+
+#############################
+# post.lua
+#############################
+# POSTs a JSON body with the given number of items, the same body
+# that toolset/benchmark/test_types/post_type.py builds to verify
+rm -rf post.lua
+cat << 'EOF' | tee post.lua
+init = function(args)
+  local n = tonumber(args[1]) or 1
+  local items = {}
+  for i = 1, n do
+    items[i] = string.format('{"id":%d,"name":"item %d","score":%d.5,"tags":["alpha","beta"]}', i, i, i % 100)
+  end
+  wrk.method = "POST"
+  wrk.body = '{"items":[' .. table.concat(items, ",") .. ']}'
+  wrk.headers["Content-Type"] = "application/json"
+end
+EOF
+cat latency.lua >> post.lua
@@ -31,6 +31,17 @@ INSERT INTO Fortune (id, message) VALUES (10, 'Computers make very fast, very ac
 INSERT INTO Fortune (id, message) VALUES (11, '<script>alert("This should not be displayed in a browser alert box.");</script>');
 INSERT INTO Fortune (id, message) VALUES (12, 'フレームワークのベンチマーク');
 
+-- Lets frameworks that cache the fortunes (LISTEN fortune_changed) know when to drop them
+CREATE OR REPLACE FUNCTION notify_fortune_changed() RETURNS trigger AS $$
+BEGIN
+  PERFORM pg_notify('fortune_changed', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER fortune_changed AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Fortune
+  FOR EACH STATEMENT EXECUTE PROCEDURE notify_fortune_changed();
+
 
 DROP TABLE IF EXISTS "World";
 CREATE TABLE  "World" (
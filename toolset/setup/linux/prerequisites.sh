@@ -36,6 +36,10 @@ sudo pip install colorama==0.3.1
 sudo pip install progressbar==2.2
 sudo pip install requests
 
+# Used by --profile. Optional, so a failure here is not fatal
+sudo pip install py-spy || true
+sudo apt-get -qqy install linux-tools-common linux-tools-$(uname -r) || true
+
 # Get the ulimit from the benchmark config
 if [ -f benchmark.cfg ]; then
   FILE=benchmark.cfg